@@ -9,9 +9,61 @@ If Python and Arcade are installed, this example can be run from the command lin
 python -m arcade.examples.instruction_and_game_over_screens
 """
 
-import arcade
+import time
+START_TIME = time.perf_counter()    # Startup timings count from here, before the slow imports
+
+import contextlib
+import sys
+# arcade prints its sound warnings on import, which would corrupt --capture -
+with contextlib.redirect_stdout(sys.stderr):
+    import arcade
+import argparse
+import array
+import bisect
+import csv
+import gc
+import hashlib
+import heapq
+import importlib
+import importlib.util
+import json
+import math
+import multiprocessing
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFont
 import random
 import os
+import socket
+import struct
+import threading
+import tracemalloc
+import zlib
+from collections import deque, namedtuple
+from pyglet import gl
+
+
+class LazyModule:
+    """
+    Stands in for a module that is slow to import and only some paths use.
+    The first attribute looked up imports it, and puts the module itself in
+    this module's globals under alias, in place of the stand-in.
+    """
+
+    def __init__(self, name, alias):
+        self.name = name
+        self.alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.name)
+        globals()[self.alias] = module
+        return getattr(module, attr)
+
+
+# numpy is only needed for the array backend and the environments, asyncio
+# only for the game server; neither is imported unless they are used
+np = LazyModule("numpy", "np") if importlib.util.find_spec("numpy") else None
+asyncio = LazyModule("asyncio", "asyncio")
 
 SPRITE_SCALING = 1.0
 
@@ -19,59 +71,202 @@ SCREEN_WIDTH = 562
 SCREEN_HEIGHT = 644
 SCREEN_TITLE = "1943: The Battle of Midway"
 
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "midway")
+STAGE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stages", "midway.json")
+SEA_IMAGE = "images/midway/sea.png"
+
+# Backgrounds scroll down under everything else, each one image wrapped top
+# to bottom: image, center x (None centers it on screen), pixels per tick
+# and a shade its colors are scaled by. The parallax cloud layers are only
+# drawn when asked for.
+SEA_SPEED = 10
+BACKGROUND_LAYERS = [(SEA_IMAGE, None, SEA_SPEED, 1.0)]
+PARALLAX_LAYERS = [("images/midway/cloud-left.png", 60, 6, 0.8),
+                   ("images/midway/cloud-right.png", SCREEN_WIDTH - 60, 6, 0.8)]
+
+# Animation frames of the player, the carrier and the powerup
+PLAYER_IMAGES = ["images/midway/Plane1.png", "images/midway/Plane2.png", "images/midway/Plane3.png"]
+CARRIER_IMAGES = ["images/midway/Enemy1.png", "images/midway/Enemy2.png", "images/midway/Enemy3.png"]
+POWER_IMAGES = ["images/midway/Pow1a.png", "images/midway/Pow1b.png", "images/midway/Pow1c.png"]
+
 # "states" of the game 
 START_SCREEN = 0
 INSTRUCTIONS = 1
 GAME_RUNNING = 2
 GAME_OVER = 3
+GAME_OVER_PENDING = 4    # Player shot down, the game plays on a moment
+
+# Sound effects playing at once, in total and of any one effect
+MAX_VOICES = 16
+MAX_VOICES_PER_SOUND = 4
+
+# Seconds between losing the last life and the "Game over" screen
+GAME_OVER_DELAY = 3.0
 
 ENEMY_COUNT = 50
 MOVEMENT_SPEED  = 5
 PLAYER_LIVES = 3
 
-class Background(arcade.Sprite):
+# How far each kind of sprite moves every tick
+FIGHTER_SPEED = (0, -5)
+RED_SPEED = (1, -2)
+CLOUD_SPEED = (0, -2)
+CARRIER_SPEED = (-1, -1)
+POWERUP_SPEED = (0, -2)
 
-    def __init__(self,image):
-        super().__init__(image)
-        self.change_y = -10
+# Stage entities appear this far above the top of the screen
+SPAWN_MARGIN = 64
+
+# The game logic runs in fixed steps, whatever the frame rate
+FIXED_DT = 1 / 60
+MAX_STEPS_PER_UPDATE = 5
+
+# Input bits for one step of the game logic
+KEY_UP = 1
+KEY_DOWN = 2
+KEY_LEFT = 4
+KEY_RIGHT = 8
+KEY_FIRE = 16
+
+# Most bullets alive at once, see SpritePool
+BULLET_POOL_SIZE = 500
+
+# Explosions: the frames of explode.png, and how many may play at once
+EXPLOSION_SHEET = "images/midway/explode.png"
+EXPLOSION_FRAME_SIZE = 64
+EXPLOSION_COLUMNS = 4
+EXPLOSION_FRAMES = 16
+MAX_EXPLOSIONS = 4096
+
+# The entity budget, what the world lets in at once: bullets in flight,
+# explosions playing, explosion frames moved on per tick, and how many
+# eighths of the fighter and red waves spawn. The defaults cap nothing.
+SPAWN_DENSITY_STEPS = 8
+SPAWN_THINNED = ("fighter", "red")
+EntityBudget = namedtuple("EntityBudget",
+                          ["max_bullets", "max_explosions", "explosion_step", "spawn_density"],
+                          defaults=[0xFFFF, MAX_EXPLOSIONS, 1, SPAWN_DENSITY_STEPS])
+
+# The budgets FrameGovernor steps down through while frames run long,
+# what costs least to lose going first
+BUDGET_LEVELS = [
+    EntityBudget(),
+    EntityBudget(explosion_step=2),
+    EntityBudget(max_bullets=200, max_explosions=128, explosion_step=2),
+    EntityBudget(max_bullets=100, max_explosions=64, explosion_step=2, spawn_density=6),
+    EntityBudget(max_bullets=50, max_explosions=32, explosion_step=3, spawn_density=4),
+]
+GOVERNOR_WINDOW = 30            # Frames over the target before stepping down
+GOVERNOR_RECOVER_WINDOW = 180   # Frames with headroom before stepping back up
+GOVERNOR_HEADROOM = 0.5         # Share of the target frames must stay under to recover
+
+# Pixels more opaque than this count for pixel-accurate collisions
+MASK_ALPHA_THRESHOLD = 0
+
+# Recorded games: a header with the seed, the final state and a digest of
+# the stage played (see stage_digest()), the entity budget changes as a
+# count then (tick, budget) entries, then the per-tick inputs as
+# (inputs, repeat count) runs
+RECORDING_MAGIC = b"M43R"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<4sBBIIiiQQ")
+RECORDING_BUDGETS = struct.Struct("<H")
+RECORDING_BUDGET = struct.Struct("<IHHBB")
+RECORDING_RUN = struct.Struct("<BH")
+
+# Named stress scenarios for --benchmark: enemies at the start, and bullets
+# fired and explosions started on every tick
+BENCHMARK_SCENARIOS = {
+    "default": {"enemies": ENEMY_COUNT, "bullets": 0, "explosions": 0},
+    "5k_enemies": {"enemies": 5000, "bullets": 0, "explosions": 0},
+    "continuous_fire": {"enemies": ENEMY_COUNT, "bullets": 100, "explosions": 0},
+    "explosion_storm": {"enemies": ENEMY_COUNT, "bullets": 0, "explosions": 50},
+}
+
+# Batch simulation results: a header, then one fixed size record per game
+BATCH_MAGIC = b"M43B"
+BATCH_VERSION = 1
+BATCH_HEADER = struct.Struct("<4sBIIII16s")   # magic, version, ticks, enemies, lives, speed, policy
+BATCH_RECORD = struct.Struct("<IIIi")         # seed, ticks survived, score, lives left
+
+# Environment actions: each W/A/S/D direction or none, with and without J
+ACTIONS = [direction | fire
+           for fire in (0, KEY_FIRE)
+           for direction in (0, KEY_UP, KEY_DOWN, KEY_LEFT, KEY_RIGHT,
+                             KEY_UP | KEY_LEFT, KEY_UP | KEY_RIGHT,
+                             KEY_DOWN | KEY_LEFT, KEY_DOWN | KEY_RIGHT)]
+OBS_ENTITIES = 32               # Nearest enemies in an environment observation
+OBS_FRAME_SCALE = 8             # Screen pixels per observation frame pixel
+OBS_FRAME_SHAPE = (SCREEN_HEIGHT // OBS_FRAME_SCALE + 1, SCREEN_WIDTH // OBS_FRAME_SCALE + 1)
+LIFE_PENALTY = 10.0             # Reward lost with each life, one kill scores 1
+
+# Snapshots of a whole game, see GameWorld.snapshot()
+SNAPSHOT_MAGIC = b"M43S"
+SNAPSHOT_VERSION = 1
+# magic, version, flags, seed, tick, score, lives, enemy_shot, powerup,
+# movement speed, accumulator, recording length, spawns pending, sprites
+SNAPSHOT_HEADER = struct.Struct("<4sBBQIiiBBddIII")
+SNAPSHOT_RNG = struct.Struct("<625I?d")
+SNAPSHOT_ACTOR = struct.Struct("<ddddii")      # x, y, change_x, change_y, frame, texture
+SNAPSHOT_SPRITE = struct.Struct("<Bddddh")     # tag, x, y, change_x, change_y, texture
+SNAPSHOT_SPAWN = struct.Struct("<iIiBdd")      # StageSpawner.pending entry, kind as index
+SNAPSHOT_STORE = struct.Struct("<II")          # slots in use, free slots
+# Sprite tags: the SPAWN_KINDS kinds kept in sprite lists, then these
+SNAPSHOT_TAGS = ["fighter", "red", "cloud-left", "cloud-right", "bullet", "explosion"]
+QUICKSAVE_FILE = "quicksave.m43s"
+
+# Game server messages: a type byte and the payload length, then the payload
+SERVER_PORT = 1943
+MESSAGE_HEADER = struct.Struct("<BI")
+MSG_JOIN = 1            # Client: JOIN_PAYLOAD
+MSG_INPUT = 2           # Client: one byte of KEY_* bits held
+MSG_LEAVE = 3           # Client: no payload
+MSG_WELCOME = 4         # Server: the session id joined, as "<I"
+MSG_FRAME = 5           # Server: FRAME_HEADER, then the zlib compressed body
+JOIN_PAYLOAD = struct.Struct("<IQ?")    # session id (0 for a new game), seed, seeded
+CLIENT_PAYLOAD_SIZES = {MSG_JOIN: JOIN_PAYLOAD.size, MSG_INPUT: 1, MSG_LEAVE: 0}
+MAX_MESSAGE_SIZE = 1 << 20              # Longest payload either side accepts
+# tick, explosion time, score, lives, flags, events, then how many clouds,
+# fighters, reds, bullets and explosions the body holds, see encode_frame()
+FRAME_HEADER = struct.Struct("<IIiiBB5H")
+FRAME_KEY = 1           # Flag: the body is whole, not a delta on the last one
+FRAME_GAME_OVER = 2
+EVENT_BITS = {"shoot": 1, "explode": 2, "powerup": 4, "gameover": 8}
+CLOUD_IMAGES = ["images/midway/cloud-left.png", "images/midway/cloud-right.png"]
+SNAPSHOT_INTERVAL = 2                   # Server ticks per frame sent, 30 a second
+SERVER_TICK_BUDGET = 0.75 * FIXED_DT    # Seconds of world steps per server tick
+MAX_CLIENT_BACKLOG = 256 * 1024         # Bytes queued to a client before frames are skipped
+
+# Size of a collision grid cell, about 9 x 10 cells over the playfield
+COLLISION_CELL_SIZE = 64
 
-    def update(self):
-        self.center_x += self.change_x
-        self.center_y += self.change_y
-        if self.top <= 0 : self.bottom = SCREEN_HEIGHT
 
 class Furniture(arcade.Sprite):
     def __init__(self,image):
-        super().__init__(image)
+        super().__init__()
+        self.texture = ASSETS.texture(image)
         self.center_x = 0
         self.center_y = SCREEN_HEIGHT
 
-    def update(self):
-        if self.top<=0:self.kill()
-
 class RedFighter(arcade.Sprite):
     def __init__(self,image):
-        super().__init__(image)
+        super().__init__()
+        self.texture = ASSETS.texture(image)
         self.center_x = 0
         self.center_y = 0
 
-    def update(self):
-        if self.top<=0:self.kill()
-
 class Enemy(arcade.Sprite):
     def __init__(self,image):
-        super().__init__(image)
-        self.center_x = random.randrange(SCREEN_WIDTH)
-        self.center_y = random.randrange(SCREEN_HEIGHT,SCREEN_HEIGHT*30)
-
-    def update(self):
-        if self.top<=0:self.kill()
+        super().__init__()
+        self.texture = ASSETS.texture(image)
+        self.center_x = 0
+        self.center_y = 0
 
 class Enemy1(arcade.Sprite):
     def __init__(self,image):
         self = arcade.AnimatedTimeSprite("images/midway/Enemy1.png",0.8)
-        self.textures.append(arcade.load_texture("images/midway/Enemy2.png"))
-        self.textures.append(arcade.load_texture("images/midway/Enemy3.png"))
+        self.textures.append(ASSETS.texture("images/midway/Enemy2.png"))
+        self.textures.append(ASSETS.texture("images/midway/Enemy3.png"))
         self.scale = 1.0
         self.center_x = 0
         self.center_y = 0
@@ -83,505 +278,3855 @@ class Enemy1(arcade.Sprite):
         if self.top<=0:self.kill()
 
 
-class Explosion(arcade.Sprite):
-    """ create explosion sprite"""
-    def __init__(self, texture_list,x,y):
-        """texture_list load"""
-        super().__init__()
-        self.center_x = x
-        self.center_y = y
-        # 第一帧
-        self.current_texture = 0      # 这是造型索引号
-        self.textures = texture_list  # 这是每帧图片列表
-        self.set_texture(self.current_texture)
+class Scheduler:
+    """
+    Calls functions once after a delay, as update() is fed the elapsed
+    time. Nothing waits or sleeps. MyGame uses it for the pause between
+    the player going down and the game over screen.
+    """
 
-    def update(self):
-        self.current_texture += 1
-        if self.current_texture < len(self.textures):
-            self.set_texture(self.current_texture)
+    def __init__(self):
+        self.time = 0.0
+        self.queue = []         # Heap of (due time, event number, callback)
+        self.next_id = 0
+
+    def schedule(self, delay, callback):
+        """ Call callback() once delay seconds have passed """
+        heapq.heappush(self.queue, (self.time + delay, self.next_id, callback))
+        self.next_id += 1
+
+    def clear(self):
+        self.queue = []
+
+    def update(self, delta_time):
+        self.time += delta_time
+        while self.queue and self.queue[0][0] <= self.time:
+            _, _, callback = heapq.heappop(self.queue)
+            callback()
+
+
+class AudioMixer:
+    """
+    Plays the game's sound effects through a fixed number of voices.
+
+    Each WAV is decoded once by load(), which may run on a background
+    thread; until it is done effects are dropped and the music waits.
+    Background music is streamed from disk. play() only queues an effect;
+    flush() starts the queued effects once per frame, so the same effect
+    fired several times in a frame plays as one voice, and effects beyond
+    the voice limits are dropped.
+    """
+
+    def __init__(self, sound_dir, effects, music,
+                 max_voices=MAX_VOICES, max_per_sound=MAX_VOICES_PER_SOUND):
+        self.max_voices = max_voices
+        self.max_per_sound = max_per_sound
+        self.sound_dir = sound_dir
+        self.effect_files = effects
+        self.music_file = music
+        self.effects = {}
+        self.music = None
+        self.loaded = False
+        self.music_wanted = False
+        self.music_voice = None
+        self.voices = {name: [] for name in effects}   # Voice handles still playing
+        self.pending = {}                               # Effect name -> times fired this frame
+        self.played = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def load(self):
+        """ Decode the effects and open the music """
+        effects = {name: arcade.Sound(os.path.join(self.sound_dir, file_name))
+                   for name, file_name in self.effect_files.items()}
+        music = arcade.Sound(os.path.join(self.sound_dir, self.music_file), streaming=True)
+        self.effects = effects
+        self.music = music
+        self.loaded = True
+
+    def play(self, name):
+        """ Queue an effect for the next flush() """
+        if name in self.pending:
+            self.coalesced += 1
+            self.pending[name] += 1
         else:
-            self.kill()
+            self.pending[name] = 1
 
-class Bullet(arcade.Sprite):
-    """ Bullet class, inherited from the character class that comes with Arcade, it is shot from the coordinates of the aircraft """
-    def __init__(self,image,plane):
-        super().__init__(image)
-        self.center_x = plane.center_x
-        self.center_y = plane.center_y
-        self.change_y = 20
+    def flush(self):
+        """ Start the effects queued since the last flush """
+        if not self.loaded:
+            self.dropped += len(self.pending)
+            self.pending.clear()
+            return
+        if self.music_wanted and self.music_voice is None:
+            self.music.play()
+            self.music_voice = self.music.voice_handle
+        if not self.pending:
+            return
+        audio = arcade.sound._audiolib
+        active = 0
+        for name, handles in self.voices.items():
+            if audio:
+                handles[:] = [h for h in handles if audio.is_valid_voice_handle(h)]
+            active += len(handles)
+        for name in self.pending:
+            handles = self.voices[name]
+            if active >= self.max_voices or len(handles) >= self.max_per_sound:
+                self.dropped += 1
+                continue
+            sound = self.effects[name]
+            sound.play()
+            self.played += 1
+            if sound.voice_handle is not None:
+                handles.append(sound.voice_handle)
+                active += 1
+        self.pending.clear()
 
-    def update(self):
-        """ update coordinates"""
-        self.center_x += self.change_x
-        self.center_y += self.change_y
-        if self.bottom >  SCREEN_HEIGHT: self.kill()
+    def play_music(self):
+        """ Start the music on the next flush() """
+        self.music_wanted = True
 
-class MyGame(arcade.Window):
+    def stop_music(self):
+        self.music_wanted = False
+        if self.music_voice is not None:
+            arcade.sound._audiolib.stop(self.music_voice)
+            self.music_voice = None
+
+    def stats(self):
+        """ Counters for the profiler overlay """
+        return {"voices": sum(len(handles) for handles in self.voices.values()),
+                "played": self.played,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped}
+
+
+class FrameProfiler:
     """
-    Main application class.
+    Per-frame timings of the named phases of updating and drawing, shown by
+    the F3 overlay and exported as CSV or JSON. Does nothing while disabled.
     """
 
-    def __init__(self, screen_width, screen_height, title):
-        """ Constructor """
-        # Call the parent constructor. Required and must be the first line.
-        super().__init__(screen_width, screen_height, title)
+    def __init__(self, enabled=False, history=36000):
+        self.enabled = enabled
+        self.frames = deque(maxlen=history)
+        self.current = {}
+        self.last = None
+        self.frame_start = None
 
-        # Set the working directory (where we expect to find files) to the same
-        # directory this .py file is in. You can leave this out of your own
-        # code, but it is needed to easily run the examples using "python -m"
-        # as mentioned at the top of this program.
-        file_path = os.path.dirname(os.path.abspath(__file__))
-        os.chdir(file_path)
+    def clock(self):
+        return time.perf_counter() if self.enabled else 0.0
 
-        # Crate the explosion animation
-        self.enemy_explosion_images = []
-        columns = 4
-        count = 16
-        sprite_width = 64
-        sprite_height = 64
-        file_name = "images/midway/explode.png"
-        # Load the explosions from a sprite sheet
-        self.enemy_explosion_images = arcade.load_spritesheet(file_name, sprite_width, sprite_height, columns, count)
-
-        # Load music sounds
-        self.background_music = arcade.sound.load_sound("images/midway/background.wav")
-        self.shoot_sound = arcade.sound.load_sound("images/midway/Shot.wav")
-        self.explode_sound = arcade.sound.load_sound("images/midway/explode.wav")
-        self.powerup_sound = arcade.sound.load_sound("images/midway/powerup.wav")
-        self.gameover_sound = arcade.sound.load_sound("images/midway/gameover.wav")
-
-        # Play background music
-        arcade.sound.play_sound(self.background_music)
-        
-    # STEP 2: Add this function.
-        # Set the background color
-        arcade.set_background_color(arcade.color.WHITE)
+    def start(self):
+        """ Start timing a run of laps """
+        if self.enabled:
+            self.last = time.perf_counter()
 
-        # Start 'state' will be showing the first page of instructions.
-        self.current_state = START_SCREEN
+    def lap(self, name):
+        """ Charge the time since the previous lap or start() to name """
+        if not self.enabled or self.last is None:
+            return
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.0) + now - self.last
+        self.last = now
 
-        #self.player_list = None
-        #self.coin_list = None
+    def add(self, name, since):
+        """ Charge the time since a clock() reading to name """
+        if self.enabled:
+            self.current[name] = self.current.get(name, 0.0) + time.perf_counter() - since
 
-        # Set up the player
-        self.player_sprite = None
+    def end_frame(self, **counts):
+        """ Close the frame's row of timings (in ms) and entity counts """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            row = {"frame": len(self.frames), "frame_ms": (now - self.frame_start) * 1000}
+            for name, seconds in self.current.items():
+                row[name] = seconds * 1000
+            row.update(counts)
+            self.frames.append(row)
+        self.current = {}
+        self.last = None
+        self.frame_start = now
 
-        # Set up the enemy
-        self.enemy_sprite = None
+    def percentiles(self, window=120):
+        """ p50 and p99 frame time in ms over the last window frames """
+        times = sorted(row["frame_ms"] for row in list(self.frames)[-window:])
+        if not times:
+            return 0.0, 0.0
+        return times[len(times) // 2], times[min(len(times) - 1, len(times) * 99 // 100)]
 
-        # Set up the POW
-        self.power_sprite = None
+    def export(self, path):
+        """ Write the trace to path, as JSON if it ends in .json, else CSV """
+        frames = list(self.frames)
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump(frames, f, indent=1)
+            return
+        fields = []
+        for row in frames:
+            fields += [name for name in row if name not in fields]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fields, restval=0)
+            writer.writeheader()
+            writer.writerows(frames)
 
-        # STEP 1: Put each instruction page in an image. Make sure the image
-        # matches the dimensions of the window, or it will stretch and look
-        # ugly. You can also do something similar if you want a page between
-        # each level.
-        self.instructions = []
-        texture = arcade.load_texture("images/midway/Logo1.png")
-        self.instructions.append(texture)
-        texture = arcade.load_texture("images/midway/Logo2.png")
-        self.instructions.append(texture)
-
-        self.player_sprite = arcade.AnimatedTimeSprite("images/midway/Plane1.png",0.8)
-        self.player_sprite.textures.append(arcade.load_texture("images/midway/Plane2.png"))
-        self.player_sprite.textures.append(arcade.load_texture("images/midway/Plane3.png"))
-        self.player_sprite.scale = 1.0
-        
-        self.enemy_sprite = arcade.AnimatedTimeSprite("images/midway/Enemy1.png",0.8)
-        self.enemy_sprite.textures.append(arcade.load_texture("images/midway/Enemy2.png"))
-        self.enemy_sprite.textures.append(arcade.load_texture("images/midway/Enemy3.png"))
-        self.enemy_sprite.scale = 1.0
 
-        self.power_sprite = arcade.AnimatedTimeSprite("images/midway/Pow1a.png",0.8)
-        self.power_sprite.textures.append(arcade.load_texture("images/midway/Pow1b.png"))
-        self.power_sprite.textures.append(arcade.load_texture("images/midway/Pow1c.png"))
-        self.power_sprite.scale = 1.0
+class FrameGovernor:
+    """
+    Holds the frame rate by trading entities for time. MyGame hands it what
+    each frame's update and draw cost; when they take longer than a frame
+    at target_fps for most of a window of frames, the world's EntityBudget
+    steps down a level of BUDGET_LEVELS, and once frames have had plenty of
+    headroom for a longer window it steps back up. Every decision is
+    logged as a line of JSON with the timings and counts behind it, to
+    log_path or else stderr, for tuning the levels to a machine.
+    """
 
-    def setup(self):
-        """
-        Set up the game.
-        """
-        self.score = 0
-        self.enemy_shot = 0
-        self.power_col = False
-        self.powerup = 1
-        enemy_shot = False
-        powerup = True
+    def __init__(self, target_fps=60, log_path=None, levels=BUDGET_LEVELS,
+                 window=GOVERNOR_WINDOW, recover_window=GOVERNOR_RECOVER_WINDOW,
+                 headroom=GOVERNOR_HEADROOM):
+        self.target_ms = 1000 / target_fps
+        self.log_path = log_path
+        self.levels = levels
+        self.window = window
+        self.headroom = headroom
+        self.level = 0
+        self.costs = deque(maxlen=recover_window)    # (update ms, draw ms)
+        self.decisions = []
 
-        # Sprite lists
-        self.cloud_list = arcade.SpriteList()
+    def budget(self):
+        return self.levels[self.level]
 
-        self.enemy_list = arcade.SpriteList()
-        self.red_list = arcade.SpriteList()
+    def frame(self, world, update_ms, draw_ms):
+        """ Take a frame's costs, set the world's budget if that's due """
+        costs = self.costs
+        costs.append((update_ms, draw_ms))
+        if len(costs) < self.window:
+            return
+        frames = list(costs)[-self.window:]
+        totals = sorted(update + draw for update, draw in frames)
+        if totals[len(totals) // 2] > self.target_ms and self.level < len(self.levels) - 1:
+            level = self.level + 1
+        elif len(costs) == costs.maxlen and self.level > 0:
+            # Nearly all of the longer window well under, not just a lull
+            frames = list(costs)
+            totals = sorted(update + draw for update, draw in frames)
+            if totals[len(totals) * 9 // 10] >= self.target_ms * self.headroom:
+                return
+            level = self.level - 1
+        else:
+            return
+        decision = {"tick": world.tick, "level": level, "from": self.level,
+                    "frames": len(frames), "target_ms": round(self.target_ms, 2),
+                    "median_ms": round(totals[len(totals) // 2], 2),
+                    "p90_ms": round(totals[len(totals) * 9 // 10], 2),
+                    "update_ms": round(sum(update for update, draw in frames) / len(frames), 2),
+                    "draw_ms": round(sum(draw for update, draw in frames) / len(frames), 2)}
+        decision.update(world.entity_counts())
+        decision["budget"] = self.levels[level]._asdict()
+        self.decisions.append(decision)
+        self.log(decision)
+        # Every level gets a full window before the next decision
+        self.level = level
+        costs.clear()
+        world.set_budget(self.budget())
 
-        self.bullet_list = arcade.SpriteList()
+    def log(self, decision):
+        line = json.dumps(decision)
+        if self.log_path is None:
+            print(line, file=sys.stderr)
+            return
+        with open(self.log_path, "a") as f:
+            f.write(line + "\n")
 
-        self.enemy_explosion_list = arcade.SpriteList()
-        self.power_list = arcade.SpriteList()
 
-        self.all_sprites_list = arcade.SpriteList()
+class StartupReport:
+    """
+    Milliseconds from START_TIME to each startup milestone, the first time
+    it is reached: the imports done, the window open, the first frame
+    drawn, and each StartupLoader step finished.
+    """
 
-        # Set up the player
-        self.player_sprite.health  = PLAYER_LIVES        # No of Lives
-        self.player_sprite.center_x = SCREEN_WIDTH //2
-        self.player_sprite.center_y = 50
-        self.all_sprites_list.append(self.player_sprite)
+    def __init__(self):
+        self.marks = {}
 
-        self.enemy_sprite.center_x = SCREEN_WIDTH+30
-        self.enemy_sprite.center_y = SCREEN_HEIGHT+30
-        self.all_sprites_list.append(self.enemy_sprite)
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = round(1000 * (time.perf_counter() - START_TIME), 1)
 
-        self.power_sprite.center_x = SCREEN_WIDTH+30
-        self.power_sprite.center_y = SCREEN_HEIGHT+30
-        self.all_sprites_list.append(self.power_sprite)
-
-        # Set up enemies
-        for i in range(ENEMY_COUNT):
-            # Create Enemies
-            enemy = Enemy("images/midway/Fighter1.png")
-            self.enemy_list.append(enemy)
-            self.all_sprites_list.append(enemy)
-
-        for i in range(5):
-            redfighter = RedFighter("images/midway/Fighter2.png")
-            redfighter.center_x = 0
-            redfighter.center_y = SCREEN_HEIGHT-i*30
-            self.red_list.append(redfighter)
-            self.all_sprites_list.append(redfighter)
-
-        for i in range(5):
-            clouds = Furniture("images/midway/cloud-right.png")
-            clouds.center_x = SCREEN_WIDTH - (10 * i + random.randrange(10,50))
-            clouds.center_y = SCREEN_HEIGHT + (300 * i) + random.randrange(0,1000)
-            self.cloud_list.append(clouds)
-            self.all_sprites_list.append(clouds)
-
-        for i in range(5):
-            clouds = Furniture("images/midway/cloud-left.png")
-            clouds.center_x = 10 * i + random.randrange(10,50)
-            clouds.center_y = SCREEN_HEIGHT + (300 * i) + random.randrange(0,1000)
-            self.cloud_list.append(clouds)
-            self.all_sprites_list.append(clouds)
-
-        sea_image = "images/midway/sea.png"
-        # Setting a Fixed Background To cover up rolling background cracks
-        self.background = arcade.Sprite(sea_image)
-        self.background.center_x = SCREEN_WIDTH // 2
-        self.background.bottom = 0
-
-        # Set the scrolling background, the two first drawn characters move down,
-        # move to a certain coordinate and go to the top
-        self.background1 = Background(sea_image)
-        self.background1.center_x = SCREEN_WIDTH // 2
-        self.background1.bottom = 0
-        self.all_sprites_list.append(self.background1)
-
-        self.background2 = Background(sea_image)
-        self.background2.center_x = SCREEN_WIDTH // 2
-        self.background2.bottom = SCREEN_HEIGHT
-        self.all_sprites_list.append(self.background2)
+    def report(self):
+        return dict(self.marks)
 
-        self.interval = 60
-        self.interval_counter = 0
 
-        # Don't show the mouse cursor
-        self.set_mouse_visible(False)
+STARTUP = StartupReport()
 
-    def draw_instructions_page(self, page_number):
-        """
-        Draw an instruction page. Load the page as an image.
-        """
-        page_texture = self.instructions[page_number]
-        arcade.draw_texture_rectangle(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2,
-                                      page_texture.width,
-                                      page_texture.height, page_texture, 0)
 
+class StartupLoader:
+    """
+    Runs the slow loading steps one after another on a background thread
+    while the start screen shows, marking each in STARTUP. done() once
+    they have all finished. A step that fails stops the loader with its
+    traceback printed and done() all the same; the assets then load on the
+    main thread when a texture is first asked for.
+    """
 
-    # STEP 3: Add this function
-    def draw_game_over(self):
-        """
-        Draw "Game over" across the screen.
-        """
-        self.draw_instructions_page(1)
+    def __init__(self):
+        self.steps = []
+        self.finished = threading.Event()
+        self.thread = None
 
-        output = "Game Over"
-        arcade.draw_text(output, 150, 322, arcade.color.BLACK, 44)
+    def add(self, name, load):
+        self.steps.append((name, load))
 
-        output = "Press SPACE to restart"
-        arcade.draw_text(output, 145, 40, arcade.color.BLACK, 24)
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
 
+    def run(self):
+        try:
+            for name, load in self.steps:
+                load()
+                STARTUP.mark(name)
+        finally:
+            STARTUP.mark("ready")
+            self.finished.set()
 
-    # STEP 4: Take the drawing code you currently have in your
-    # on_draw method AFTER the start_render call and MOVE to a new
-    # method called draw_game.
-    def draw_game(self):
-        """
-        Draw all the sprites, along with the score.
-        """
-        # Draw all the sprites.
-        # Start rendering, this command must be before all redraw commands
-        self.background.draw()    # Unmovable background to make up for
-                                  # the problem of rolling background cracks
-        self.background1.draw()   # Paint scroll background
-        self.background2.draw()   # Paint scroll background
-
-        self.cloud_list.draw()
-        # Draw all the characters
-        self.enemy_list.draw()
-        self.red_list.draw()
-        if self.player_sprite.health > 0:
-           self.player_sprite.draw()
-        self.bullet_list.draw()
-        self.enemy_sprite.draw()
-        self.power_sprite.draw()
-        self.enemy_explosion_list.draw()
+    def done(self):
+        return self.finished.is_set()
 
-        # 画得分情况
-        score = "Kills: " + str(self.score) + ", Lives: " + str(self.player_sprite.health)
-        arcade.draw_text(score, 10, 20, arcade.color.WHITE, 14 )
 
-        if self.player_sprite.health < 1:  # end of game
-           self.interval_counter +=1
-           if self.interval_counter % self.interval == 0: self.interval_counter = 0
+class CollisionMask:
+    """
+    The opaque pixels of an image as one int of bits per row, top row
+    first, the leftmost pixel in the highest bit. Two masks touch if any
+    pair of facing rows, shifted into line, ANDs to non-zero.
+    """
 
+    def __init__(self, image, threshold=MASK_ALPHA_THRESHOLD):
+        self.width, self.height = image.size
+        opaque = image.getchannel("A").point(lambda a: 255 if a > threshold else 0).convert("1")
+        data = opaque.tobytes()
+        stride = (self.width + 7) // 8
+        padding = stride * 8 - self.width
+        self.rows = [int.from_bytes(data[i:i + stride], "big") >> padding
+                     for i in range(0, len(data), stride)]
+        # Only the rows between the first and last opaque ones get compared
+        filled = [row for row, bits in enumerate(self.rows) if bits]
+        self.first = filled[0] if filled else 0
+        self.last = filled[-1] if filled else -1
 
-    # STEP 5: Update the on_draw function to look like this. Adjust according
-    # to the number of instruction pages you have.
-    def on_draw(self):
+    def overlaps(self, x, y, other, other_x, other_y):
+        """ Whether this mask centred on x, y touches other centred on other_x, other_y """
+        left = math.floor(x - self.width / 2 + 0.5)
+        top = math.floor(y + self.height / 2 + 0.5)
+        other_left = math.floor(other_x - other.width / 2 + 0.5)
+        other_top = math.floor(other_y + other.height / 2 + 0.5)
+        # My row r faces other's row r + offset, my bits line up with
+        # other's once moved up by shift
+        offset = other_top - top
+        shift = (other_left + other.width) - (left + self.width)
+        rows = self.rows
+        other_rows = other.rows
+        start = max(self.first, other.first - offset)
+        stop = min(self.last, other.last - offset)
+        if shift >= 0:
+            for row in range(start, stop + 1):
+                if (rows[row] << shift) & other_rows[row + offset]:
+                    return True
+        else:
+            shift = -shift
+            for row in range(start, stop + 1):
+                if (rows[row] >> shift) & other_rows[row + offset]:
+                    return True
+        return False
+
+
+def sprites_collide(sprite1, sprite2):
+    """
+    arcade.check_for_collision with a bounding box reject, then the two
+    textures' CollisionMasks. The sprites here are never scaled or turned;
+    ones without a mask fall back to the hit box polygons.
+    """
+    texture1 = sprite1.texture
+    texture2 = sprite2.texture
+    x1, y1 = sprite1.position
+    x2, y2 = sprite2.position
+    if abs(x1 - x2) > (texture1.width + texture2.width) / 2:
+        return False
+    if abs(y1 - y2) > (texture1.height + texture2.height) / 2:
+        return False
+    mask1 = getattr(texture1, "collision_mask", None)
+    mask2 = getattr(texture2, "collision_mask", None)
+    if mask1 is None or mask2 is None:
+        return arcade.check_for_collision(sprite1, sprite2)
+    return mask1.overlaps(x1, y1, mask2, x2, y2)
+
+
+class AssetCache:
+    """
+    Every PNG in images/midway decoded once, with a shared arcade.Texture
+    per file that brings its hit box and collision mask. MyGame's
+    StartupLoader does the decoding on a background thread; asking for a
+    texture waits for it. Menu screens use loose_texture() instead, which
+    doesn't.
+    """
+
+    def __init__(self, directory=ASSET_DIR):
+        self.directory = directory
+        self.loaded = False
+        self.textures = {}
+        self.sheets = {}
+        self.loose = {}         # Textures decoded on their own before load()
+        self.lock = threading.Lock()
+
+    def load(self):
+        """ Decode every PNG into its texture """
+        with self.lock:
+            if self.loaded:
+                return
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith(".png"):
+                    image = PIL.Image.open(os.path.join(self.directory, name)).convert("RGBA")
+                    self.textures[name] = self._texture(name, image)
+            self.loaded = True
+
+    def _texture(self, name, image):
+        texture = arcade.Texture(name, image)
+        texture.hit_box_points = arcade.calculate_points(image)
+        # Vertical hit box extent from the center, for culling without
+        # building each sprite's adjusted hit box
+        texture.hit_box_bottom = min(y for x, y in texture.hit_box_points)
+        texture.hit_box_top = max(y for x, y in texture.hit_box_points)
+        texture.collision_mask = CollisionMask(image)
+        return texture
+
+    def texture(self, file_name):
+        """ The shared texture for a file such as "images/midway/Shot1.png" """
+        if not self.loaded:
+            self.load()
+        return self.textures[os.path.basename(file_name)]
+
+    def loose_texture(self, file_name):
         """
-        Render the screen.
+        Like texture(), but before load() has finished the file is decoded
+        on its own rather than waiting. No hit box or collision mask, for
+        the menu screens only.
         """
+        if self.loaded:
+            return self.texture(file_name)
+        name = os.path.basename(file_name)
+        if name not in self.loose:
+            image = PIL.Image.open(os.path.join(self.directory, name)).convert("RGBA")
+            self.loose[name] = arcade.Texture(name, image)
+        return self.loose[name]
 
-        # This command has to happen before we start drawing
-        arcade.start_render()
+    def image(self, file_name):
+        """ The decoded image of a file, not to be changed """
+        return self.texture(file_name).image
 
-        if self.current_state == START_SCREEN:
-            self.draw_instructions_page(0)
-            logo_1943 = arcade.Sprite("images/midway/1943Logo.png")
-            logo_1943.center_x  = SCREEN_WIDTH // 2
-            logo_1943.center_y  = 500
-            arcade.Sprite.draw(logo_1943)
-            output = "The Battle of Midway"
-            arcade.draw_text(output, 40, 360, arcade.color.BLACK, 44, bold=True)
-            arcade.draw_text(output, 45, 365, arcade.color.WHITE, 44, bold=True)
-            output = "Press Enter for Keys"
-            arcade.draw_text(output, 272, 117, arcade.color.BLACK, 24)
-            arcade.draw_text(output, 275, 120, arcade.color.WHITE, 24)
-            output = "Press SPACE to play"
-            arcade.draw_text(output, 272, 87, arcade.color.BLACK, 24)
-            arcade.draw_text(output, 275, 90, arcade.color.WHITE, 24)
+    def spritesheet(self, file_name, sprite_width, sprite_height, columns, count):
+        """ Like arcade.load_spritesheet, cut from the decoded file and cached """
+        name = os.path.basename(file_name)
+        key = (name, sprite_width, sprite_height, columns, count)
+        if key not in self.sheets:
+            sheet = self.image(name)
+            self.sheets[key] = []
+            for i in range(count):
+                x = (i % columns) * sprite_width
+                y = (i // columns) * sprite_height
+                image = sheet.crop((x, y, x + sprite_width, y + sprite_height))
+                self.sheets[key].append(self._texture("%s-%d" % (name, i), image))
+        return self.sheets[key]
 
-        elif self.current_state == INSTRUCTIONS:
-            self.draw_instructions_page(1)
-            output = "W: up, S: down, A: left, D: right, J: fire"
-            arcade.draw_text(output, 50, 342, arcade.color.BLACK, 24)
-            arcade.draw_text(output, 48, 344, arcade.color.WHITE, 24)
-            output = "Press SPACE to play"
-            arcade.draw_text(output, 150, 286, arcade.color.BLACK, 24)
-            arcade.draw_text(output, 148, 288, arcade.color.WHITE, 24)
 
-        elif self.current_state == GAME_RUNNING:
-            self.draw_game()
+ASSETS = AssetCache()
 
+
+def animated_sprite(images):
+    """ An AnimatedTimeSprite cycling through the textures of images """
+    sprite = arcade.AnimatedTimeSprite()
+    for image in images:
+        sprite.textures.append(ASSETS.texture(image))
+    return sprite
+
+
+class PooledSprite(arcade.Sprite):
+    """ Sprite that goes back to its SpritePool when it is killed """
+    pool = None
+    active = False
+
+    def kill(self):
+        super().kill()
+        if self.pool is not None:
+            self.pool.deactivate(self)
+
+def compact_sprite_list(sprite_list, keep):
+    """
+    Drop the sprites whose keep flag is false from sprite_list in one pass,
+    rather than a kill() each that rebuilds the list's index every time.
+    Pooled sprites go back to their pool.
+    """
+    if all(keep):
+        return
+    survivors = []
+    for sprite, kept in zip(sprite_list.sprite_list, keep):
+        if kept:
+            survivors.append(sprite)
+            continue
+        sprite.sprite_lists.remove(sprite_list)
+        if getattr(sprite, "pool", None) is not None:
+            sprite.pool.deactivate(sprite)
+    # SpriteList has no bulk removal, so swap in the new list and index
+    sprite_list.sprite_list = survivors
+    sprite_list.sprite_idx = {sprite: i for i, sprite in enumerate(survivors)}
+    sprite_list._vao1 = None
+
+
+class SpritePool:
+    """
+    Sprites kept for reuse instead of being built and thrown away. hits and
+    misses count activations served from the pool and ones that had to
+    build a new sprite, dropped counts ones refused at capacity.
+    """
+
+    def __init__(self, factory, capacity):
+        self.factory = factory
+        self.capacity = capacity
+        self.sprites = []
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+
+    def activate(self):
+        """ A sprite ready to reset and use, or None if the pool is full """
+        if self.free:
+            sprite = self.free.pop()
+            self.hits += 1
+        elif len(self.sprites) < self.capacity:
+            sprite = self.factory()
+            sprite.pool = self
+            self.sprites.append(sprite)
+            self.misses += 1
         else:
-            self.draw_game()
-            self.draw_game_over()
+            self.dropped += 1
+            return None
+        sprite.active = True
+        return sprite
 
-    # STEP 6: Do something like adding this to your on_mouse_press to flip
-    # between instruction pages.
-    def on_mouse_press(self, x, y, button, modifiers):
-        """
-        Called when the user presses a mouse button.
-        """
-        # Change states as needed.
+    def deactivate(self, sprite):
+        if sprite.active:
+            sprite.active = False
+            self.free.append(sprite)
 
-    def on_mouse_motion(self, x, y, dx, dy):
-        """
-        Called whenever the mouse moves.
-        """
-        # Only move the user if the game is running.
-        #if self.current_state == GAME_RUNNING:
-        #    self.player_sprite.center_x = x
-        #    self.player_sprite.center_y = y
+    def release_all(self):
+        """ Take every sprite back, e.g. when a new game starts """
+        for sprite in self.sprites:
+            if sprite.active:
+                sprite.kill()
 
-    def on_key_press(self, key, modifiers):
-        """ Key button events """
-        if key == arcade.key.ENTER:
-            arcade.sound.play_sound(self.explode_sound)
-            if self.current_state == START_SCREEN:
-                self.current_state = INSTRUCTIONS
-            elif self.current_state == INSTRUCTIONS:
-                self.current_state = START_SCREEN
-            elif self.current_state == GAME_OVER:
-                self.current_state = INSTRUCTIONS
-        if key == arcade.key.SPACE and self.current_state != GAME_RUNNING:
-            self.current_state = GAME_RUNNING
-            self.setup()
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "dropped": self.dropped,
+                "active": len(self.sprites) - len(self.free), "size": len(self.sprites)}
 
-        if key == arcade.key.W:
-            self.player_sprite.change_y = MOVEMENT_SPEED
-        elif key == arcade.key.S:
-            self.player_sprite.change_y = -MOVEMENT_SPEED
-        elif key == arcade.key.A:
-            self.player_sprite.change_x = -MOVEMENT_SPEED
-        elif key == arcade.key.D:
-            self.player_sprite.change_x = MOVEMENT_SPEED
-        elif key == arcade.key.J:
-            arcade.sound.play_sound(self.shoot_sound)
-            self.bullet = Bullet("images/midway/Shot1.png",self.player_sprite)
-            self.bullet_list.append(self.bullet)
-            self.all_sprites_list.append(self.bullet)
+class ExplosionFX:
+    """
+    Every explosion as one row of x, y and start time in a flat float
+    array, laid out to upload as an instance buffer. They all last
+    EXPLOSION_FRAMES frames, so they finish in the order they started and
+    update() only moves the head past the finished rows: there's no work
+    per explosion per frame, the frame shown is worked out when drawing.
+    """
 
-    def on_key_release(self, key, modifiers):
-        """ Key release event """
-        if key == arcade.key.W or key == arcade.key.S:
-            self.player_sprite.change_y = 0
-        elif key == arcade.key.A or key == arcade.key.D:
-            self.player_sprite.change_x = 0
+    def __init__(self, frames=EXPLOSION_FRAMES, capacity=MAX_EXPLOSIONS):
+        self.frames = frames
+        self.capacity = capacity
+        self.dropped = 0
+        self.clear()
 
-    # STEP 7: Only update if the game state is GAME_RUNNING like below:
-    def update(self, delta_time):
-        """ Movement and game logic """
-        # Animate the player on the start screen
-        if self.current_state == START_SCREEN:
-            self.player_sprite.update()
-            self.player_sprite.update_animation()
+    def clear(self):
+        self.time = 0
+        self.instances = array.array("f")
+        self.head = 0           # Rows before head have finished
+        self.version = 0        # Changes whenever the playing rows do
+        self.peak = 0           # Most explosions playing at once this game
 
-        # Only move and do things if the game is running.
-        if self.current_state == GAME_RUNNING:
-            # Update coordinates, etc.
-            #print(self.background2.bottom - self.background1.top)
-            distance = self.background2.bottom - self.background1.top
-            if  distance < 0 and distance > -80:   # Fissure remedy
-                self.background2.bottom = self.background1.top
-
-            self.enemy_list.move(0, -5)
-            self.red_list.move(1,-2)
-            self.cloud_list.move(0,-2)
-            self.player_sprite.update_animation()
-            self.enemy_sprite.update_animation()
-            self.power_sprite.update_animation()
-            self.all_sprites_list.update()
-
-            if self.player_sprite.health > 0:
-                # Collision detection between players and all enemy aircraft.
-                for enemy_list in [ self.enemy_list, self.red_list ]:
-                    hit_list = arcade.check_for_collision_with_list(self.player_sprite,enemy_list)
-                    # Traverse the list of enemy aircraft encountered
-                    for enemy in hit_list:
-                        enemy.kill()
-                        self.player_sprite.health -= 1
-                        if self.player_sprite.health < 0 :
-                            e = Explosion(self.enemy_explosion_images)
-                            e.center_x = self.player_sprite.center_x
-                            e.center_y = self.player_sprite.center_y
-                            e.update()
-                            self.player_sprite.kill()
-
-                        e = Explosion(self.enemy_explosion_images,enemy.center_x,enemy.center_y)
-                        e.center_x = enemy.center_x
-                        e.center_y = enemy.center_y
-                        e.update()
-                        arcade.sound.play_sound(self.explode_sound)
-                        self.enemy_explosion_list.append(e)
-                        self.all_sprites_list.append(e)
-
-            # Is Powerup dropped?
-            if self.powerup:
-                self.power_sprite.top = self.power_sprite.top - 2
-                self.power_sprite.update()
-                # pickup power up
-                power_col = arcade.check_for_collision(self.power_sprite,self.player_sprite)
-                if power_col:
-                    arcade.sound.play_sound(self.powerup_sound)
-                    self.powerup = 0
-                    self.power_sprite.kill()
-
-            if not self.enemy_shot:
-                enemy_hit = arcade.check_for_collision(self.enemy_sprite,self.player_sprite)
-                if enemy_hit:
-                    self.enemy_shot = True
-                    self.enemy_sprite.kill()
-                    self.enemy_sprite.update()
-                    es = Explosion(self.enemy_explosion_images,self.enemy_sprite.center_x,self.enemy_sprite.center_y)
-                    es.center_x = self.enemy_sprite.center_x
-                    es.center_y = self.enemy_sprite.center_y
-                    es.update()
-                    self.enemy_explosion_list.append(es)
-                    self.all_sprites_list.append(es)
-
-            if self.power_sprite.top < 0:
-                self.power_sprite.kill()
-                self.powerup = 0
+    def __len__(self):
+        return len(self.instances) // 3 - self.head
 
-            # Did we shoot the powerup enemy?
-            if not self.enemy_shot:
-
-               self.enemy_sprite.right = self.enemy_sprite.right - 1
-               self.enemy_sprite.top = self.enemy_sprite.top - 1
-
-               shot_enemy = arcade.check_for_collision_with_list(self.enemy_sprite,self.bullet_list)
-               if len(shot_enemy) > 0:
-                   arcade.sound.play_sound(self.explode_sound)
-                   self.enemy_sprite.remove_from_sprite_lists()
-                   self.enemy_sprite.kill()
-                   es = Explosion(self.enemy_explosion_images,self.enemy_sprite.center_x,self.enemy_sprite.center_y)
-                   es.center_x = self.enemy_sprite.center_x
-                   es.center_y = self.enemy_sprite.center_y
-                   es.update()
-                   self.enemy_explosion_list.append(es)
-                   self.all_sprites_list.append(es)
-                   self.enemy_shot = 1
-                   self.power_sprite.top = self.enemy_sprite.top
-                   self.power_sprite.center_x = self.enemy_sprite.center_x
-                   self.power_sprite.center_y = self.enemy_sprite.center_y
-                   self.power_sprite.update_animation()
-                   self.power_sprite.update()
-
-            # Did each enemy hit the bullet
-            for enemy_bullet in [ self.enemy_list, self.red_list ]:
-                for enemy in enemy_bullet:
-                    hit_list = arcade.check_for_collision_with_list(enemy,self.bullet_list)
-                    if len(hit_list) > 0:
-                        enemy.kill()
-                        arcade.sound.play_sound(self.explode_sound)
-                        [b.kill() for b in hit_list]   # Delete every bullet encountered
-                        self.score += len(hit_list)
-                        e = Explosion(self.enemy_explosion_images,enemy.center_x,enemy.center_y)
-                        e.center_x = enemy.center_x
-                        e.center_y = enemy.center_y
-                        e.update()
-                        self.enemy_explosion_list.append(e)
-                        self.all_sprites_list.append(e)
-
-            # If we've collected all the games, then move to a "GAME_OVER" state.
-            if self.player_sprite.health <= 0:
-                e = Explosion(self.enemy_explosion_images,self.player_sprite.center_x,self.player_sprite.center_y)
-                e.center_x = self.player_sprite.center_x
-                e.center_y = self.player_sprite.center_y
-                e.update()
-                self.enemy_explosion_list.append(e)
-                self.all_sprites_list.append(e)
-                self.power_sprite.update()
-                self.current_state = GAME_OVER
-                self.background_music.stop()
-                arcade.sound.play_sound(self.gameover_sound)
-                arcade.pause(3)
-                self.set_mouse_visible(True)
-
-            if self.player_sprite.left < 0:
-                self.player_sprite.left = 0
-            elif self.player_sprite.right > SCREEN_WIDTH - 1:
-                self.player_sprite.right = SCREEN_WIDTH - 1
-
-            if self.player_sprite.bottom < 60:
-                self.player_sprite.bottom = 60
-            elif self.player_sprite.top > SCREEN_HEIGHT - 1:
-                self.player_sprite.top = SCREEN_HEIGHT - 1
+    def add(self, x, y, frame=1):
+        """ Start an explosion at x, y, showing frame until the next update() """
+        if len(self) >= self.capacity:
+            self.dropped += 1
+            return False
+        self.instances.extend((x, y, self.time + 1 - frame))
+        self.version += 1
+        self.peak = max(self.peak, len(self))
+        return True
 
+    def update(self, step=1):
+        """ Move on step frames and let the finished explosions go """
+        self.time += step
+        with memoryview(self.instances) as rows:
+            # Gone once the frame shown would be past the last
+            head = bisect.bisect_right(rows[2::3], self.time - self.frames + 1, self.head)
+        if head == self.head:
+            return
+        self.head = head
+        self.version += 1
+        # Drop the finished rows once they are most of the array
+        if head > 1024 and head * 6 > len(self.instances):
+            del self.instances[:head * 3]
+            self.head = 0
 
-def main():
-    MyGame(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    def rows(self):
+        """ (x, y, frame shown) for every playing explosion, oldest first """
+        instances = self.instances
+        for i in range(self.head * 3, len(instances), 3):
+            yield instances[i], instances[i + 1], self.time + 1 - int(instances[i + 2])
+
+    def playing(self):
+        """ The playing rows as bytes, for the instance buffer """
+        return self.instances[self.head * 3:].tobytes()
+
+    def load(self, time, rows):
+        """ Replace the playing explosions with (x, y, frame shown) rows, as at time """
+        self.time = time
+        self.instances = array.array("f")
+        for x, y, frame in rows:
+            self.instances.extend((x, y, time + 1 - frame))
+        self.head = 0
+        self.version += 1
+
+    def stats(self):
+        return {"active": len(self), "peak": self.peak, "dropped": self.dropped,
+                "capacity": self.capacity}
+
+class Bullet(PooledSprite):
+    """ Bullet class, inherited from the character class that comes with Arcade, it is shot from the coordinates of the aircraft """
+    def __init__(self,image,plane):
+        super().__init__()
+        self.texture = ASSETS.texture(image)
+        self.center_x = plane.center_x
+        self.center_y = plane.center_y
+        self.change_y = 20
+
+    def reset(self, x, y):
+        """ Fire again from x, y """
+        self.center_x = x
+        self.center_y = y
+
+# What a stage wave can place: the sprite list it joins, its class, image
+# and speed. The carrier is the one powerup enemy_sprite, moved into place.
+SPAWN_KINDS = {
+    "fighter": ("enemy_list", Enemy, "images/midway/Fighter1.png", FIGHTER_SPEED),
+    "red": ("red_list", RedFighter, "images/midway/Fighter2.png", RED_SPEED),
+    "cloud-left": ("cloud_list", Furniture, "images/midway/cloud-left.png", CLOUD_SPEED),
+    "cloud-right": ("cloud_list", Furniture, "images/midway/cloud-right.png", CLOUD_SPEED),
+    "carrier": (None, None, "images/midway/Enemy1.png", CARRIER_SPEED),
+}
+
+
+def load_stage(path=STAGE_FILE):
+    """
+    Read a stage file. It is JSON with a list of waves, each placing count
+    sprites of one kind at "tick": x and y are [low, high) ranges picked
+    from at random, "step" is added once more for each sprite in the wave,
+    and "repeat" / "interval" play the wave again every interval ticks.
+    """
+    with open(path) as f:
+        stage = json.load(f)
+    for wave in stage["waves"]:
+        if wave["kind"] not in SPAWN_KINDS:
+            raise ValueError("%s: unknown kind %r" % (path, wave["kind"]))
+    return stage
+
+
+def stage_digest(stage):
+    """ 64 bits identifying a stage by its contents, for recordings """
+    text = json.dumps(stage, sort_keys=True, separators=(",", ":"))
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+class StageSpawner:
+    """
+    Streams a stage into the world. Each sprite a wave places is queued for
+    the tick it comes within SPAWN_MARGIN of the screen, so a long stage
+    costs nothing per frame until its enemies are about to show.
+    """
+
+    def __init__(self, stage, rng, enemy_count=None):
+        self.pending = []
+        for wave in stage["waves"]:
+            kind = wave["kind"]
+            count = wave.get("count", 1)
+            if enemy_count is not None and kind == "fighter":
+                count = enemy_count
+            x_low, x_high = wave["x"]
+            y_low, y_high = wave["y"]
+            step_x, step_y = wave.get("step", (0, 0))
+            for repeat in range(wave.get("repeat", 1)):
+                tick = wave.get("tick", 0) + repeat * wave.get("interval", 0)
+                for i in range(count):
+                    x = rng.randrange(x_low, x_high) if x_high > x_low else x_low
+                    y = rng.randrange(y_low, y_high) if y_high > y_low else y_low
+                    self.queue(tick, kind, x + i * step_x, y + i * step_y)
+        # Latest last, so due() pops from the end
+        self.pending.sort(reverse=True)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def queue(self, tick, kind, x, y):
+        """ Queue a sprite placed at x, y at tick, for when it nears the screen """
+        image, (change_x, change_y) = SPAWN_KINDS[kind][2:]
+        bottom = y - ASSETS.texture(image).height / 2
+        delay = 0
+        if change_y < 0:
+            delay = max(0, math.ceil((bottom - SCREEN_HEIGHT - SPAWN_MARGIN) / -change_y))
+        self.pending.append((tick + delay, len(self.pending), tick, kind, x, y))
+
+    def due(self, clock):
+        """
+        (order, kind, x, y) for everything due after clock ticks of movement,
+        moved on from where its wave placed it. order counts the sprites
+        through the stage.
+        """
+        while self.pending and self.pending[-1][0] <= clock:
+            _, order, tick, kind, x, y = self.pending.pop()
+            change_x, change_y = SPAWN_KINDS[kind][3]
+            yield order, kind, x + change_x * (clock - tick), y + change_y * (clock - tick)
+
+
+class SpatialHash:
+    """
+    Uniform grid of sprites, so a collision check only tests the sprites in
+    the cells it overlaps instead of every sprite in a list.
+    """
+
+    def __init__(self, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.sprite_cells = {}
+
+    def _cells_for(self, sprite):
+        """ Grid cells covered by the sprite's bounding box """
+        size = self.cell_size
+        x = sprite.center_x
+        y = sprite.center_y
+        half_width = sprite.width / 2
+        half_height = sprite.height / 2
+        x0 = int((x - half_width) // size)
+        x1 = int((x + half_width) // size)
+        y0 = int((y - half_height) // size)
+        y1 = int((y + half_height) // size)
+        # Most sprites are smaller than a cell, so skip building the ranges
+        if x0 == x1 and y0 == y1:
+            return [(x0, y0)]
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def __len__(self):
+        return len(self.sprite_cells)
+
+    def build(self, sprites):
+        """ Rebuild the grid from scratch """
+        self.cells = {}
+        self.sprite_cells = {}
+        for sprite in sprites:
+            self.insert(sprite)
+
+    def insert(self, sprite):
+        cells = self._cells_for(sprite)
+        self.sprite_cells[sprite] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(sprite)
+
+    def remove(self, sprite):
+        for cell in self.sprite_cells.pop(sprite, ()):
+            self.cells[cell].remove(sprite)
+
+    def move(self, sprite):
+        """ Refresh a sprite's cells after it has moved """
+        self.remove(sprite)
+        self.insert(sprite)
+
+    def query(self, sprite):
+        """ Sprites sharing a cell with the sprite, each once """
+        candidates = {}
+        for cell in self._cells_for(sprite):
+            for other in self.cells.get(cell, ()):
+                candidates[other] = True
+        candidates.pop(sprite, None)
+        return list(candidates)
+
+    def check_for_collision(self, sprite):
+        """ Like arcade.check_for_collision_with_list, using the grid and masks """
+        x = sprite.center_x
+        y = sprite.center_y
+        half_width = sprite.width / 2
+        half_height = sprite.height / 2
+        hits = []
+        for other in self.query(sprite):
+            # Cheap bounding box reject before the exact hit box test
+            if abs(other.center_x - x) > half_width + other.width / 2:
+                continue
+            if abs(other.center_y - y) > half_height + other.height / 2:
+                continue
+            if sprites_collide(sprite, other):
+                hits.append(other)
+        return hits
+
+
+class EntityStore:
+    """
+    Many entities of one kind kept as NumPy arrays of positions, velocities,
+    alive flags and texture indices, so they move, cull and collide in bulk.
+    Sprites are only filled in for the visible ones when it is time to draw.
+    """
+
+    def __init__(self, textures, capacity=64):
+        if np is None:
+            raise ImportError("EntityStore needs numpy")
+        self.textures = textures
+        self.half_width = textures[0].width / 2
+        self.half_height = textures[0].height / 2
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.change_x = np.zeros(capacity)
+        self.change_y = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.texture = np.zeros(capacity, dtype=np.int16)
+        self.count = 0          # Slots in use, dead or alive
+        self.free = []          # Dead slots below count, ready for reuse
+        self.sprites = []       # Sprites reused for drawing
+
+    def __len__(self):
+        return self.count - len(self.free)
+
+    def _grow(self):
+        capacity = len(self.x) * 2
+        for name in ("x", "y", "change_x", "change_y", "alive", "texture"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def spawn(self, x, y, change_x=0, change_y=0, texture=0):
+        """ Add an entity and return its slot """
+        if self.free:
+            i = self.free.pop()
+        else:
+            if self.count == len(self.x):
+                self._grow()
+            i = self.count
+            self.count += 1
+        self.x[i] = x
+        self.y[i] = y
+        self.change_x[i] = change_x
+        self.change_y[i] = change_y
+        self.texture[i] = texture
+        self.alive[i] = True
+        return i
+
+    def to_bytes(self):
+        """ The slots in use, dead and alive, and the free list as bytes """
+        n = self.count
+        return b"".join([SNAPSHOT_STORE.pack(n, len(self.free)),
+                         struct.pack("<%dI" % len(self.free), *self.free),
+                         self.x[:n].tobytes(), self.y[:n].tobytes(),
+                         self.change_x[:n].tobytes(), self.change_y[:n].tobytes(),
+                         self.alive[:n].tobytes(), self.texture[:n].tobytes()])
+
+    def from_bytes(self, data, offset=0):
+        """ Replace the contents with to_bytes() data, return the offset after it """
+        n, free = SNAPSHOT_STORE.unpack_from(data, offset)
+        offset += SNAPSHOT_STORE.size
+        self.free = list(struct.unpack_from("<%dI" % free, data, offset))
+        offset += 4 * free
+        while len(self.x) < n:
+            self._grow()
+        self.count = n
+        for name in ("x", "y", "change_x", "change_y", "alive", "texture"):
+            array = getattr(self, name)
+            size = n * array.itemsize
+            array[:] = 0
+            array[:n] = np.frombuffer(data, array.dtype, n, offset)
+            offset += size
+        return offset
+
+    def kill(self, slots):
+        slots = np.unique(slots)
+        slots = slots[self.alive[slots]]
+        self.alive[slots] = False
+        self.free.extend(slots.tolist())
+
+    def live(self):
+        return np.flatnonzero(self.alive[:self.count])
+
+    def positions(self, slots):
+        return list(zip(self.x[slots].tolist(), self.y[slots].tolist()))
+
+    def move(self):
+        n = self.count
+        self.x[:n] += self.change_x[:n]
+        self.y[:n] += self.change_y[:n]
+
+    def cull(self, bottom=0, top=None):
+        """ Kill whatever has gone below the bottom or above the top """
+        n = self.count
+        gone = self.y[:n] + self.half_height <= bottom
+        if top is not None:
+            gone |= self.y[:n] - self.half_height > top
+        self.kill(np.flatnonzero(gone & self.alive[:n]))
+
+    def hits(self, x, y, half_width, half_height):
+        """ Live slots whose bounding box overlaps the given one """
+        n = self.count
+        overlap = (np.abs(self.x[:n] - x) <= self.half_width + half_width) & \
+                  (np.abs(self.y[:n] - y) <= self.half_height + half_height)
+        return np.flatnonzero(overlap & self.alive[:n])
+
+    def touching(self, sprite):
+        """ Live slots whose collision masks touch the sprite's """
+        x, y = sprite.position
+        slots = self.hits(x, y, sprite.width / 2, sprite.height / 2)
+        mask = sprite.texture.collision_mask
+        touching = [self.textures[t].collision_mask.overlaps(sx, sy, mask, x, y)
+                    for sx, sy, t in zip(self.x[slots].tolist(), self.y[slots].tolist(),
+                                         self.texture[slots].tolist())]
+        return slots[np.array(touching, dtype=bool)]
+
+    def pairs(self, other, chunk=1024):
+        """ Slot pairs (mine, other's) whose collision masks touch """
+        mine = self.live()
+        theirs = other.live()
+        reach_x = self.half_width + other.half_width
+        reach_y = self.half_height + other.half_height
+        # Nothing outside the span of the other store can touch it
+        if len(theirs):
+            y = self.y[mine]
+            mine = mine[(y >= other.y[theirs].min() - reach_y) &
+                        (y <= other.y[theirs].max() + reach_y)]
+        found_mine = []
+        found_theirs = []
+        for start in range(0, len(mine), chunk):
+            block = mine[start:start + chunk]
+            overlap = (np.abs(self.x[block, None] - other.x[None, theirs]) <= reach_x) & \
+                      (np.abs(self.y[block, None] - other.y[None, theirs]) <= reach_y)
+            rows, cols = np.nonzero(overlap)
+            found_mine.append(block[rows])
+            found_theirs.append(theirs[cols])
+        if not found_mine:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        mine = np.concatenate(found_mine)
+        theirs = np.concatenate(found_theirs)
+
+        # Bounding boxes only found the candidates, the masks decide
+        touching = [self.textures[t].collision_mask.overlaps(x, y, other.textures[u].collision_mask, ox, oy)
+                    for x, y, t, ox, oy, u in zip(self.x[mine].tolist(), self.y[mine].tolist(),
+                                                  self.texture[mine].tolist(),
+                                                  other.x[theirs].tolist(), other.y[theirs].tolist(),
+                                                  other.texture[theirs].tolist())]
+        touching = np.array(touching, dtype=bool)
+        return mine[touching], theirs[touching]
+
+    def sync(self, sprite_list):
+        """ Make sprite_list hold one sprite per live, on-screen entity """
+        live = self.live()
+        y = self.y[live]
+        visible = live[(y + self.half_height > 0) & (y - self.half_height < SCREEN_HEIGHT)]
+        while len(self.sprites) < len(visible):
+            self.sprites.append(arcade.Sprite())
+        for sprite, x, y, t in zip(self.sprites, self.x[visible].tolist(),
+                                   self.y[visible].tolist(), self.texture[visible].tolist()):
+            sprite.texture = self.textures[t]
+            sprite.center_x = x
+            sprite.center_y = y
+        while len(sprite_list) > len(visible):
+            sprite_list.pop()
+        for sprite in self.sprites[len(sprite_list):len(visible)]:
+            sprite_list.append(sprite)
+
+
+class GameWorld:
+    """
+    The game logic and world state, without a window, drawing or sound.
+
+    MyGame renders this world and plays the sounds it names in ``events``.
+    A headless caller can drive it directly with ``step()`` or ``advance()``.
+
+    With array_backend the Enemy fighters and the bullets live in NumPy
+    EntityStores instead of sprites, and only the visible ones are copied
+    into enemy_list and bullet_list by ``sync_sprites()``.
+    """
+
+    def __init__(self, array_backend=False, stage=None):
+        """ Load the sprites the world needs """
+        if array_backend and np is None:
+            raise ImportError("the array backend needs numpy")
+        self.array_backend = array_backend
+        self.stage = stage if stage is not None else load_stage()
+
+        # Three frame animations; every frame's texture brings its collision mask
+        self.player_sprite = animated_sprite(PLAYER_IMAGES)
+        self.enemy_sprite = animated_sprite(CARRIER_IMAGES)
+        self.power_sprite = animated_sprite(POWER_IMAGES)
+
+        self.enemy_textures = [ASSETS.texture("images/midway/Fighter1.png")]
+        self.bullet_textures = [ASSETS.texture("images/midway/Shot1.png")]
+
+        # Bullets are reused rather than rebuilt
+        self.bullet_pool = SpritePool(
+            lambda: Bullet("images/midway/Shot1.png",self.player_sprite), BULLET_POOL_SIZE)
+        # Explosions are only data, MyGame draws them with ExplosionRenderer
+        self.explosions = ExplosionFX()
+
+        # Names of the sounds triggered since the last advance()
+        self.events = []
+        self.accumulator = 0.0
+        self.tick = 0
+        self.game_over = False
+        self.profiler = FrameProfiler()
+
+        # Caps on the entities, kept from one game to the next
+        self.budget = EntityBudget()
+        self.budget_changes = []
+        self.budget_schedule = []
+
+    def setup(self, seed=None, enemy_count=None, lives=PLAYER_LIVES,
+              movement_speed=MOVEMENT_SPEED):
+        """
+        Set up the world for a new game. The same seed and the same inputs
+        always play out the same game. enemy_count replaces the size of the
+        stage's fighter waves.
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # One byte of KEY_* inputs per step, see save_recording()
+        self.recording = bytearray()
+
+        self.score = 0
+        self.enemy_shot = 0
+        self.power_col = False
+        self.powerup = 1
+        self.events = []
+        self.accumulator = 0.0
+        self.tick = 0
+        self.game_over = False
+        self.movement_speed = movement_speed
+
+        self.new_lists()
+
+        # A game starting under a budget records it from the first tick
+        self.budget_changes = []
+        self.follow_due_budgets()
+        self.set_budget(self.budget)
+
+        # Restart the animations, the hit box follows the frame shown
+        for sprite in (self.player_sprite, self.enemy_sprite, self.power_sprite):
+            sprite.frame = 0
+            sprite.cur_texture_index = 0
+            sprite.set_texture(0)
+
+        # Set up the player
+        self.player_sprite.health  = lives        # No of Lives
+        self.player_sprite.center_x = SCREEN_WIDTH //2
+        self.player_sprite.center_y = 50
+        self.player_sprite.change_x = 0
+        self.player_sprite.change_y = 0
+
+        # Off screen until the stage brings the carrier in
+        self.enemy_sprite.center_x = SCREEN_WIDTH+30
+        self.enemy_sprite.center_y = SCREEN_HEIGHT+30
+        self.enemy_shot = 1
+
+        self.power_sprite.center_x = SCREEN_WIDTH+30
+        self.power_sprite.center_y = SCREEN_HEIGHT+30
+
+        # Enemies and clouds come in from the stage as they near the screen
+        self.spawner = StageSpawner(self.stage, self.rng, enemy_count)
+        self.spawn_due(0)
+
+    def new_lists(self):
+        """ Empty sprite lists, collision grids and stores for a new game """
+        self.bullet_pool.release_all()
+        self.explosions.clear()
+
+        # Sprite lists
+        self.cloud_list = arcade.SpriteList()
+
+        self.enemy_list = arcade.SpriteList()
+        self.red_list = arcade.SpriteList()
+
+        self.bullet_list = arcade.SpriteList()
+
+        self.power_list = arcade.SpriteList()
+
+        # Collision grids, rebuilt every step
+        self.bullet_hash = SpatialHash()
+        self.enemy_hash = SpatialHash()
+
+        # Array backend stores, None when enemies and bullets are sprites
+        self.enemy_store = None
+        self.bullet_store = None
+        if self.array_backend:
+            self.enemy_store = EntityStore(self.enemy_textures, ENEMY_COUNT)
+            self.bullet_store = EntityStore(self.bullet_textures)
+
+    def spawn_due(self, clock):
+        """ Bring in the stage sprites due after clock ticks """
+        density = self.budget.spawn_density
+        for order, kind, x, y in self.spawner.due(clock):
+            list_name, sprite_class, image, (change_x, change_y) = SPAWN_KINDS[kind]
+            if kind in SPAWN_THINNED and order % SPAWN_DENSITY_STEPS >= density:
+                # Thinned out by the budget
+                continue
+            if kind == "carrier":
+                self.enemy_sprite.center_x = x
+                self.enemy_sprite.center_y = y
+                self.enemy_shot = 0
+            elif kind == "fighter" and self.enemy_store is not None:
+                self.enemy_store.spawn(x, y, change_x, change_y)
+            else:
+                self.spawn_sprite(kind, x, y)
+
+    def spawn_sprite(self, kind, x, y):
+        """ Add a sprite of a SPAWN_KINDS kind at x, y and return it """
+        list_name, sprite_class, image, _ = SPAWN_KINDS[kind]
+        sprite = sprite_class(image)
+        sprite.center_x = x
+        sprite.center_y = y
+        getattr(self, list_name).append(sprite)
+        return sprite
+
+    def advance(self, delta_time, inputs=0):
+        """
+        Run as many fixed steps as delta_time covers, carrying the remainder
+        over to the next call. Returns the number of steps run.
+        """
+        self.events = []
+        self.accumulator += delta_time
+        steps = 0
+        while self.accumulator >= FIXED_DT:
+            if steps == MAX_STEPS_PER_UPDATE:
+                # Too far behind, drop the backlog instead of spiralling
+                self.accumulator = 0.0
+                break
+            self.step(inputs)
+            inputs &= ~KEY_FIRE        # One shot per key press
+            self.accumulator -= FIXED_DT
+            steps += 1
+        return steps
+
+    def fire(self, x=None, y=None):
+        """ Shoot a bullet from x, y, or from the player """
+        if x is None:
+            x = self.player_sprite.center_x
+            y = self.player_sprite.center_y
+        bullets = self.bullet_list if self.bullet_store is None else self.bullet_store
+        if len(bullets) >= self.budget.max_bullets:
+            return
+        if self.bullet_store is not None:
+            self.bullet_store.spawn(x,y,0,20)
+            self.events.append("shoot")
+            return
+        bullet = self.bullet_pool.activate()
+        if bullet is None:
+            return
+        self.events.append("shoot")
+        bullet.reset(x,y)
+        self.bullet_list.append(bullet)
+
+    def explode(self, x, y):
+        """ Start an explosion at x, y """
+        since = self.profiler.clock()
+        self.explosions.add(x,y)
+        self.profiler.add("explode", since)
+
+    def set_budget(self, budget):
+        """
+        Cap the entities with an EntityBudget from the next tick on. The
+        caps change how the game plays, so each change is kept with its
+        tick in budget_changes for save_recording().
+        """
+        previous = self.budget_changes[-1][1] if self.budget_changes else EntityBudget()
+        self.budget = budget
+        self.explosions.capacity = budget.max_explosions
+        if budget == previous:
+            return
+        if self.budget_changes and self.budget_changes[-1][0] == self.tick:
+            self.budget_changes.pop()
+        self.budget_changes.append((self.tick, budget))
+
+    def follow_budgets(self, changes):
+        """
+        Make the budget changes of a recording as its ticks come round,
+        from the setup() of the next game
+        """
+        self.budget_schedule = sorted(changes, reverse=True)
+
+    def follow_due_budgets(self):
+        schedule = self.budget_schedule
+        while schedule and schedule[-1][0] <= self.tick:
+            self.set_budget(schedule.pop()[1])
+
+    def snapshot(self):
+        """
+        The whole game state as compact bytes for restore(): every sprite's
+        position, velocity and animation frame, the scores and flags, the
+        stage still to come, the inputs so far and the RNG. The stage itself
+        isn't included, restore into a world built with the same stage.
+        """
+        version, rng_state, gauss = self.rng.getstate()
+        flags = (self.array_backend | self.game_over << 1 | self.power_col << 2
+                 | (gauss is not None) << 3)
+
+        kinds = list(SPAWN_KINDS)
+        pending = [SNAPSHOT_SPAWN.pack(spawn_tick, order, tick, kinds.index(kind), x, y)
+                   for spawn_tick, order, tick, kind, x, y in self.spawner.pending]
+
+        # Every sprite list in order, each sprite tagged with what it is
+        kind_textures = {ASSETS.texture(image): kind
+                         for kind, (_, _, image, _) in SPAWN_KINDS.items()}
+        in_order = list(self.cloud_list)
+        in_order += self.red_list
+        if self.enemy_store is None:
+            in_order += self.enemy_list
+            in_order += self.bullet_list
+        sprites = []
+        for sprite in in_order:
+            texture = 0
+            if isinstance(sprite, Bullet):
+                tag = "bullet"
+            else:
+                tag = kind_textures[sprite.texture]
+            sprites.append(SNAPSHOT_SPRITE.pack(SNAPSHOT_TAGS.index(tag),
+                                                sprite.center_x, sprite.center_y,
+                                                sprite.change_x, sprite.change_y, texture))
+        for x, y, frame in self.explosions.rows():
+            sprites.append(SNAPSHOT_SPRITE.pack(SNAPSHOT_TAGS.index("explosion"),
+                                                x, y, 0, 0, frame))
+
+        parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags,
+                                      self.seed, self.tick, self.score,
+                                      self.player_sprite.health, int(self.enemy_shot),
+                                      self.powerup, self.movement_speed, self.accumulator,
+                                      len(self.recording), len(pending), len(sprites)),
+                 SNAPSHOT_RNG.pack(*rng_state, gauss is not None, gauss or 0.0),
+                 bytes(self.recording)]
+        for sprite in (self.player_sprite, self.enemy_sprite, self.power_sprite):
+            parts.append(SNAPSHOT_ACTOR.pack(sprite.center_x, sprite.center_y,
+                                             sprite.change_x, sprite.change_y,
+                                             sprite.frame, sprite.cur_texture_index))
+        parts += pending
+        parts += sprites
+        if self.enemy_store is not None:
+            parts += [self.enemy_store.to_bytes(), self.bullet_store.to_bytes()]
+        return b"".join(parts)
+
+    def restore(self, data):
+        """ Go back to the state saved by snapshot() """
+        (magic, version, flags, seed, tick, score, health, enemy_shot, powerup,
+         movement_speed, accumulator, recorded, pending, sprites) = \
+            SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a version %d snapshot" % SNAPSHOT_VERSION)
+        if bool(flags & 1) != self.array_backend:
+            raise ValueError("snapshot is from the other entity backend")
+        offset = SNAPSHOT_HEADER.size
+
+        self.seed = seed
+        self.tick = tick
+        self.score = score
+        self.enemy_shot = enemy_shot
+        self.powerup = powerup
+        self.movement_speed = movement_speed
+        self.accumulator = accumulator
+        self.game_over = bool(flags & 2)
+        self.power_col = bool(flags & 4)
+        self.events = []
+
+        rng_state = SNAPSHOT_RNG.unpack_from(data, offset)
+        offset += SNAPSHOT_RNG.size
+        self.rng = random.Random()
+        self.rng.setstate((3, rng_state[:625], rng_state[626] if flags & 8 else None))
+
+        self.recording = bytearray(data[offset:offset + recorded])
+        offset += recorded
+
+        for sprite in (self.player_sprite, self.enemy_sprite, self.power_sprite):
+            (sprite.center_x, sprite.center_y, sprite.change_x, sprite.change_y,
+             sprite.frame, sprite.cur_texture_index) = SNAPSHOT_ACTOR.unpack_from(data, offset)
+            sprite.set_texture(sprite.cur_texture_index)
+            offset += SNAPSHOT_ACTOR.size
+        self.player_sprite.health = health
+
+        # The stage still to come, the empty stage only stands in for it
+        self.spawner = StageSpawner({"waves": []}, self.rng)
+        kinds = list(SPAWN_KINDS)
+        for spawn_tick, order, wave_tick, kind, x, y in SNAPSHOT_SPAWN.iter_unpack(
+                data[offset:offset + pending * SNAPSHOT_SPAWN.size]):
+            self.spawner.pending.append((spawn_tick, order, wave_tick, kinds[kind], x, y))
+        offset += pending * SNAPSHOT_SPAWN.size
+
+        self.new_lists()
+        for tag, x, y, change_x, change_y, texture in SNAPSHOT_SPRITE.iter_unpack(
+                data[offset:offset + sprites * SNAPSHOT_SPRITE.size]):
+            tag = SNAPSHOT_TAGS[tag]
+            if tag == "bullet":
+                sprite = self.bullet_pool.activate()
+                self.bullet_list.append(sprite)
+            elif tag == "explosion":
+                self.explosions.add(x, y, texture)
+                continue
+            else:
+                sprite = self.spawn_sprite(tag, x, y)
+            sprite.center_x = x
+            sprite.center_y = y
+            sprite.change_x = change_x
+            sprite.change_y = change_y
+        offset += sprites * SNAPSHOT_SPRITE.size
+
+        if self.enemy_store is not None:
+            offset = self.enemy_store.from_bytes(data, offset)
+            self.bullet_store.from_bytes(data, offset)
+            self.sync_sprites()
+
+        # Snapshots don't hold the budget, it carries on from here and the
+        # changes after the snapshot's tick never happened
+        self.budget_changes = [change for change in self.budget_changes if change[0] <= tick]
+        self.set_budget(self.budget)
+
+    def state_hash(self):
+        """ Digest of the score, lives and every entity position """
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(struct.pack("<ii", self.score, self.player_sprite.health))
+
+        def positions(sprites):
+            return ((sprite.center_x, sprite.center_y) for sprite in sprites)
+
+        groups = [positions(self.red_list), positions(self.cloud_list),
+                  ((x, y) for x, y, frame in self.explosions.rows()),
+                  positions([self.player_sprite, self.enemy_sprite, self.power_sprite])]
+        if self.enemy_store is not None:
+            for store in (self.enemy_store, self.bullet_store):
+                live = store.live()
+                digest.update(store.x[live].tobytes())
+                digest.update(store.y[live].tobytes())
+        else:
+            groups += [positions(self.enemy_list), positions(self.bullet_list)]
+        for group in groups:
+            for x, y in group:
+                digest.update(struct.pack("<dd", x, y))
+        return int.from_bytes(digest.digest(), "little")
+
+    def entity_counts(self):
+        """ Live enemies, bullets and explosions """
+        if self.enemy_store is not None:
+            enemies = len(self.enemy_store)
+            bullets = len(self.bullet_store)
+        else:
+            enemies = len(self.enemy_list)
+            bullets = len(self.bullet_list)
+        return {"enemies": enemies + len(self.red_list), "bullets": bullets,
+                "explosions": len(self.explosions)}
+
+    def pool_stats(self):
+        """ Bullet pool and explosion counters, for sizing the limits """
+        return {"bullets": self.bullet_pool.stats(),
+                "explosions": self.explosions.stats()}
+
+    def sync_sprites(self):
+        """ Copy the visible stored entities into the sprite lists for drawing """
+        if self.enemy_store is not None:
+            self.enemy_store.sync(self.enemy_list)
+            self.bullet_store.sync(self.bullet_list)
+
+    def move_stage_sprites(self, sprite_list, change_x, change_y):
+        """ Move a list of stage sprites together, dropping those gone below the screen """
+        keep = []
+        for sprite in sprite_list:
+            x, y = sprite.position
+            y += change_y
+            sprite.position = (x + change_x, y)
+            keep.append(y + sprite.texture.hit_box_top > 0)
+        compact_sprite_list(sprite_list, keep)
+
+    def move_bullets(self):
+        """ Move the bullet sprites, dropping those gone off the top """
+        keep = []
+        for bullet in self.bullet_list:
+            x, y = bullet.position
+            y += bullet.change_y
+            bullet.position = (x + bullet.change_x, y)
+            keep.append(y + bullet.texture.hit_box_bottom <= SCREEN_HEIGHT)
+        compact_sprite_list(self.bullet_list, keep)
+
+    def bullets_touching(self, sprite):
+        """ Bullets (sprites or store slots) that hit the sprite """
+        if self.bullet_store is not None:
+            return self.bullet_store.touching(sprite)
+        return self.bullet_hash.check_for_collision(sprite)
+
+    def kill_bullets(self, hit_list):
+        if self.bullet_store is not None:
+            self.bullet_store.kill(hit_list)
+            return
+        for b in hit_list:
+            b.kill()
+            self.bullet_hash.remove(b)
+
+    def shoot_stored_enemies(self):
+        """ Bullet hits on the array backend's enemies """
+        enemies, bullets = self.enemy_store.pairs(self.bullet_store)
+        if not len(enemies):
+            return
+        self.bullet_store.kill(bullets)
+        shot, hits = np.unique(enemies, return_counts=True)
+        self.enemy_store.kill(shot)
+        self.score += int(hits.sum())
+        for x, y in self.enemy_store.positions(shot):
+            self.events.append("explode")
+            self.explode(x,y)
+
+    def step(self, inputs=0):
+        """ Advance the game by one fixed tick with the given KEY_* inputs """
+        if self.budget_schedule:
+            self.follow_due_budgets()
+        if self.game_over:
+            # Only the last explosions play out
+            self.explosions.update(self.budget.explosion_step)
+            return
+        self.tick += 1
+        self.recording.append(inputs)
+        profiler = self.profiler
+        profiler.start()
+        self.spawn_due(self.tick - 1)
+        profiler.lap("spawn")
+
+        # Steer the player from the keys held this tick
+        self.player_sprite.change_x = 0
+        self.player_sprite.change_y = 0
+        if inputs & KEY_UP:
+            self.player_sprite.change_y = self.movement_speed
+        elif inputs & KEY_DOWN:
+            self.player_sprite.change_y = -self.movement_speed
+        if inputs & KEY_LEFT:
+            self.player_sprite.change_x = -self.movement_speed
+        elif inputs & KEY_RIGHT:
+            self.player_sprite.change_x = self.movement_speed
+        if inputs & KEY_FIRE:
+            self.fire()
+        profiler.lap("input")
+
+        # One pass per kind of entity, each moving and culling in bulk
+        if self.enemy_store is not None:
+            self.enemy_store.move()
+            self.enemy_store.cull()
+            self.bullet_store.move()
+            self.bullet_store.cull(top=SCREEN_HEIGHT)
+        else:
+            self.move_stage_sprites(self.enemy_list, *FIGHTER_SPEED)
+            self.move_bullets()
+        self.move_stage_sprites(self.red_list, *RED_SPEED)
+        self.move_stage_sprites(self.cloud_list, *CLOUD_SPEED)
+        profiler.lap("move")
+        self.player_sprite.update_animation()
+        self.enemy_sprite.update_animation()
+        self.power_sprite.update_animation()
+        self.player_sprite.update()
+        self.explosions.update(self.budget.explosion_step)
+        profiler.lap("update")
+
+        enemy_lists = [ self.enemy_list, self.red_list ]
+        if self.enemy_store is not None:
+            enemy_lists = [ self.red_list ]
+        else:
+            self.bullet_hash.build(self.bullet_list)
+
+        if self.player_sprite.health > 0:
+            # Collision detection between players and all enemy aircraft.
+            hits = []
+            if self.enemy_store is not None:
+                slots = self.enemy_store.touching(self.player_sprite)
+                self.enemy_store.kill(slots)
+                hits += self.enemy_store.positions(slots)
+            for enemy_list in enemy_lists:
+                self.enemy_hash.build(enemy_list)
+                for enemy in self.enemy_hash.check_for_collision(self.player_sprite):
+                    enemy.kill()
+                    hits.append((enemy.center_x,enemy.center_y))
+            # Traverse the list of enemy aircraft encountered
+            for x, y in hits:
+                self.player_sprite.health -= 1
+                if self.player_sprite.health < 0 :
+                    # The game over check below sets off the player's explosion
+                    self.player_sprite.kill()
+
+                self.explode(x,y)
+                self.events.append("explode")
+        profiler.lap("collide_player")
+
+        # Is Powerup dropped?
+        if self.powerup:
+            self.power_sprite.top = self.power_sprite.top + POWERUP_SPEED[1]
+            self.power_sprite.update()
+            # pickup power up
+            power_col = sprites_collide(self.power_sprite,self.player_sprite)
+            if power_col:
+                self.events.append("powerup")
+                self.powerup = 0
+                self.power_sprite.kill()
+
+        if not self.enemy_shot:
+            enemy_hit = sprites_collide(self.enemy_sprite,self.player_sprite)
+            if enemy_hit:
+                self.enemy_shot = True
+                self.enemy_sprite.kill()
+                self.enemy_sprite.update()
+                self.explode(self.enemy_sprite.center_x,self.enemy_sprite.center_y)
+
+        if self.power_sprite.top < 0:
+            self.power_sprite.kill()
+            self.powerup = 0
+
+        # Did we shoot the powerup enemy?
+        if not self.enemy_shot:
+
+           self.enemy_sprite.center_x += CARRIER_SPEED[0]
+           self.enemy_sprite.center_y += CARRIER_SPEED[1]
+
+           shot_enemy = self.bullets_touching(self.enemy_sprite)
+           if len(shot_enemy) > 0:
+               self.events.append("explode")
+               self.enemy_sprite.remove_from_sprite_lists()
+               self.enemy_sprite.kill()
+               self.explode(self.enemy_sprite.center_x,self.enemy_sprite.center_y)
+               self.enemy_shot = 1
+               self.power_sprite.top = self.enemy_sprite.top
+               self.power_sprite.center_x = self.enemy_sprite.center_x
+               self.power_sprite.center_y = self.enemy_sprite.center_y
+               self.power_sprite.update_animation()
+               self.power_sprite.update()
+        profiler.lap("collide_powerup")
+
+        # Did each enemy hit the bullet
+        if self.enemy_store is not None:
+            self.shoot_stored_enemies()
+        bullets = self.bullet_hash if self.bullet_store is None else self.bullet_store
+        for enemy_bullet in enemy_lists:
+            if not len(bullets):
+                break
+            # A copy, killing an enemy takes it out of the list
+            for enemy in list(enemy_bullet):
+                hit_list = self.bullets_touching(enemy)
+                if len(hit_list) > 0:
+                    enemy.kill()
+                    self.events.append("explode")
+                    self.kill_bullets(hit_list)   # Delete every bullet encountered
+                    self.score += len(hit_list)
+                    self.explode(enemy.center_x,enemy.center_y)
+        profiler.lap("collide_bullets")
+
+        # If we've collected all the games, then move to a "GAME_OVER" state.
+        if self.player_sprite.health <= 0:
+            self.explode(self.player_sprite.center_x,self.player_sprite.center_y)
+            self.power_sprite.update()
+            self.game_over = True
+            self.events.append("gameover")
+
+        if self.player_sprite.left < 0:
+            self.player_sprite.left = 0
+        elif self.player_sprite.right > SCREEN_WIDTH - 1:
+            self.player_sprite.right = SCREEN_WIDTH - 1
+
+        if self.player_sprite.bottom < 60:
+            self.player_sprite.bottom = 60
+        elif self.player_sprite.top > SCREEN_HEIGHT - 1:
+            self.player_sprite.top = SCREEN_HEIGHT - 1
+
+
+def text_sprite(text, start_x, start_y, color, font_size, bold=False):
+    """
+    A sprite of some text, placed where arcade.draw_text puts it, to keep in
+    a sprite list instead of drawing the text on every frame.
+    """
+    rendered = arcade.draw_text(text, start_x, start_y, color, font_size, bold=bold)
+    sprite = arcade.Sprite()
+    sprite.texture = rendered.texture
+    sprite.center_x = rendered.center_x
+    sprite.center_y = rendered.center_y
+    return sprite
+
+
+class CachedText:
+    """ A text sprite in a sprite list, only rendered again when the text changes """
+
+    def __init__(self, sprite_list, start_x, start_y, color, font_size):
+        self.sprite_list = sprite_list
+        self.style = (start_x, start_y, color, font_size)
+        self.text = None
+        self.sprite = None
+
+    def set(self, text):
+        if text == self.text:
+            return
+        if self.sprite is not None:
+            self.sprite.kill()
+        self.sprite = text_sprite(text, *self.style)
+        self.sprite_list.append(self.sprite)
+        self.text = text
+
+
+class ExplosionRenderer:
+    """
+    Draws every explosion of an ExplosionFX with one instanced draw call:
+    a quad per explosion row, its frame of the sheet picked in the shader
+    from the row's start time. The instance buffer is only rewritten when
+    explosions start or finish.
+    """
+
+    VERTEX_SHADER = """
+    #version 330
+    uniform mat4 Projection;
+    uniform float Time;
+    uniform float FrameSize;
+    uniform int Columns;
+    uniform int Frames;
+
+    in vec2 in_vert;            // Quad corner, -1 to 1
+    in vec3 in_instance;        // x, y, start time
+
+    out vec2 v_uv;
+
+    void main() {
+        int frame = clamp(int(Time - in_instance.z) + 1, 0, Frames - 1);
+        int rows = (Frames + Columns - 1) / Columns;
+        vec2 cell = vec2(frame % Columns, frame / Columns);
+        // The sheet's top row is the texture's first
+        vec2 corner = vec2(in_vert.x + 1.0, 1.0 - in_vert.y) / 2.0;
+        v_uv = (cell + corner) / vec2(Columns, rows);
+        gl_Position = Projection * vec4(in_instance.xy + in_vert * FrameSize / 2.0, 0.0, 1.0);
+    }
+    """
+
+    FRAGMENT_SHADER = """
+    #version 330
+    uniform sampler2D Texture;
+
+    in vec2 v_uv;
+
+    out vec4 f_color;
+
+    void main() {
+        f_color = texture(Texture, v_uv);
+    }
+    """
+
+    def __init__(self, explosions, sheet=EXPLOSION_SHEET):
+        self.explosions = explosions
+        self.program = arcade.shader.program(vertex_shader=self.VERTEX_SHADER,
+                                             fragment_shader=self.FRAGMENT_SHADER)
+        image = ASSETS.image(sheet)
+        self.texture = arcade.shader.texture(image.size, 4, image.tobytes())
+        self.quad = arcade.shader.buffer(array.array("f", (-1, -1, 1, -1, -1, 1, 1, 1)).tobytes())
+        self.buffer = None
+        self.vao = None
+        self.rows = 0           # Instance rows the buffer holds
+        self.count = 0          # Rows uploaded
+        self.version = None     # ExplosionFX version uploaded
+
+    def upload(self):
+        explosions = self.explosions
+        self.count = len(explosions)
+        if self.count > self.rows:
+            self.rows = max(1024, 2 * self.count)
+            self.buffer = arcade.shader.Buffer.create_with_size(self.rows * 12, usage="stream")
+            self.vao = arcade.shader.vertex_array(self.program, [
+                arcade.shader.BufferDescription(self.quad, "2f", ["in_vert"]),
+                arcade.shader.BufferDescription(self.buffer, "3f", ["in_instance"], instanced=True)])
+        if self.count:
+            self.buffer.orphan()
+            self.buffer.write(explosions.playing())
+        self.version = explosions.version
+
+    def draw(self):
+        if self.version != self.explosions.version:
+            self.upload()
+        if not self.count:
+            return
+        self.texture.use(0)
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        with self.vao:
+            self.program["Projection"] = arcade.get_projection().flatten()
+            self.program["Time"] = self.explosions.time
+            self.program["FrameSize"] = EXPLOSION_FRAME_SIZE
+            self.program["Columns"] = EXPLOSION_COLUMNS
+            self.program["Frames"] = self.explosions.frames
+            self.program["Texture"] = 0
+            self.vao.render(gl.GL_TRIANGLE_STRIP, instances=self.count)
+
+
+def background_layers(layers, screen_width=SCREEN_WIDTH):
+    """
+    The image, left edge on screen and pixels per tick of each entry of
+    BACKGROUND_LAYERS or PARALLAX_LAYERS, its colors shaded
+    """
+    loaded = []
+    for file_name, center_x, speed, shade in layers:
+        image = ASSETS.image(file_name).convert("RGBA")
+        if shade != 1.0:
+            bands = [band.point(lambda value: round(value * shade)) for band in image.split()[:3]]
+            image = PIL.Image.merge("RGBA", bands + [image.getchannel("A")])
+        if center_x is None:
+            center_x = screen_width / 2
+        loaded.append((image, math.floor(center_x - image.width / 2 + 0.5), speed))
+    return loaded
+
+
+def background_scroll(world, speed, height):
+    """ How far a layer scrolling speed pixels per tick has gone, wrapped """
+    return world.tick * speed % height
+
+
+class ScrollingBackground:
+    """
+    Draws the background layers as one quad each, the layer's texture
+    wrapped top to bottom and offset by how far it has scrolled. Nothing
+    moves on the CPU and the quad covers the screen once, so there's no
+    seam between copies to patch and no fixed copy underneath to hide it.
+    """
+
+    VERTEX_SHADER = """
+    #version 330
+    uniform mat4 Projection;
+    uniform vec4 Rect;          // Quad left, bottom, width and height
+    uniform vec2 TexSize;
+    uniform float Left;         // The image's left edge on screen
+    uniform float Scroll;
+
+    in vec2 in_vert;            // Quad corner, 0 to 1
+
+    out vec2 v_uv;
+
+    void main() {
+        vec2 position = Rect.xy + in_vert * Rect.zw;
+        // The image's top row is the texture's first
+        v_uv = vec2((position.x - Left) / TexSize.x,
+                    1.0 - (position.y + Scroll) / TexSize.y);
+        gl_Position = Projection * vec4(position, 0.0, 1.0);
+    }
+    """
+
+    FRAGMENT_SHADER = """
+    #version 330
+    uniform sampler2D Texture;
+
+    in vec2 v_uv;
+
+    out vec4 f_color;
+
+    void main() {
+        f_color = texture(Texture, v_uv);
+    }
+    """
+
+    def __init__(self, world, layers=BACKGROUND_LAYERS):
+        self.world = world
+        self.program = arcade.shader.program(vertex_shader=self.VERTEX_SHADER,
+                                             fragment_shader=self.FRAGMENT_SHADER)
+        self.quad = arcade.shader.buffer(array.array("f", (0, 0, 1, 0, 0, 1, 1, 1)).tobytes())
+        self.vao = arcade.shader.vertex_array(self.program, [
+            arcade.shader.BufferDescription(self.quad, "2f", ["in_vert"])])
+        self.layers = []
+        for image, left, speed in background_layers(layers):
+            texture = arcade.shader.texture(image.size, 4, image.tobytes())
+            texture.use(0)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_REPEAT)
+            # One texel per pixel, and no blending in the clear ones' black
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+            # Only the image's columns that are on screen
+            x0 = max(left, 0)
+            x1 = min(left + image.width, SCREEN_WIDTH)
+            self.layers.append((texture, (x0, 0, x1 - x0, SCREEN_HEIGHT), image.size, left, speed))
+
+    def draw(self):
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        with self.vao:
+            self.program["Projection"] = arcade.get_projection().flatten()
+            self.program["Texture"] = 0
+            for texture, rect, size, left, speed in self.layers:
+                texture.use(0)
+                self.program["Rect"] = rect
+                self.program["TexSize"] = size
+                self.program["Left"] = left
+                self.program["Scroll"] = background_scroll(self.world, speed, size[1])
+                self.vao.render(gl.GL_TRIANGLE_STRIP)
+
+
+class RenderQueue:
+    """ Named sprite lists drawn back to front, one draw call per layer """
+
+    def __init__(self):
+        self.layers = []
+
+    def add(self, name, sprite_list):
+        self.layers.append((name, sprite_list))
+
+    def draw(self, profiler):
+        for name, sprite_list in self.layers:
+            sprite_list.draw()
+            profiler.lap("draw_" + name)
+
+
+class SoftwareTexture:
+    """
+    A texture as arrays for SoftwareRenderer: its RGB, which pixels are
+    opaque, and the few that are partly transparent. The game's sprites are
+    mostly clear or opaque, so a blit is a masked copy of the opaque pixels
+    and a blend of only the partial ones, found by their offsets in a frame
+    frame_width pixels wide.
+    """
+
+    def __init__(self, image, frame_width):
+        rgba = np.asarray(image.convert("RGBA"))
+        self.height, self.width = rgba.shape[:2]
+        self.rgb = np.ascontiguousarray(rgba[..., :3])
+        alpha = rgba[..., 3]
+        opaque = alpha == 255
+        self.solid = bool(opaque.all())
+        # One flag per channel: np.copyto is many times slower broadcasting one
+        self.mask = np.repeat(opaque[..., None], 3, axis=2)
+        partial = (alpha > 0) & ~opaque
+        self.partial_y, self.partial_x = np.nonzero(partial)
+        self.partial_offsets = self.partial_y * frame_width + self.partial_x
+        partial_alpha = alpha[partial].astype(np.uint16)[:, None]
+        self.partial_rgb = self.rgb[partial] * partial_alpha
+        self.partial_inverse = 255 - partial_alpha
+
+
+class SoftwareRenderer:
+    """
+    Draws the layers MyGame.draw_game() does into an RGB NumPy array on
+    the CPU, for capturing frames with no GPU or display. Each sprite is a
+    few whole-array operations on its clipped rectangle, and sprites
+    entirely off screen are skipped.
+    """
+
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, layers=BACKGROUND_LAYERS):
+        if np is None:
+            raise ImportError("the software renderer needs numpy")
+        self.width = width
+        self.height = height
+        self.layers = [(SoftwareTexture(image, width), left, speed)
+                       for image, left, speed in background_layers(layers, width)]
+        self.frame = np.zeros((height, width, 3), np.uint8)
+        self.pixels = self.frame.reshape(-1, 3)
+        self.textures = {}          # arcade.Texture -> SoftwareTexture
+        self.text = {}              # HUD text -> SoftwareTexture
+        self.font = None
+        self.explosion_frames = [
+            SoftwareTexture(texture.image, width)
+            for texture in ASSETS.spritesheet(EXPLOSION_SHEET, EXPLOSION_FRAME_SIZE,
+                                              EXPLOSION_FRAME_SIZE, EXPLOSION_COLUMNS,
+                                              EXPLOSION_FRAMES)]
+        self.drawn = 0
+        self.culled = 0
+
+    def texture(self, texture):
+        if texture not in self.textures:
+            self.textures[texture] = SoftwareTexture(texture.image, self.width)
+        return self.textures[texture]
+
+    def draw(self, world):
+        """ Render the world, returns the frame array (reused by the next draw) """
+        world.sync_sprites()
+        # The sea covers the whole screen, so there's nothing to clear
+        for texture, left, speed in self.layers:
+            # Copies of the layer stacked up from where the scroll has got to
+            bottom = -background_scroll(world, speed, texture.height)
+            while bottom < self.height:
+                self.blit(texture, left + texture.width / 2, bottom + texture.height / 2)
+                bottom += texture.height
+        sprites = []
+        for sprite_list in (world.cloud_list, world.enemy_list, world.red_list,
+                            world.bullet_list):
+            sprites += sprite_list
+        sprites += [world.enemy_sprite, world.power_sprite]
+        if world.player_sprite.health > 0:
+            sprites.insert(-2, world.player_sprite)
+        for sprite in sprites:
+            self.blit(self.texture(sprite.texture), sprite.center_x, sprite.center_y)
+
+        last = len(self.explosion_frames) - 1
+        for x, y, frame in world.explosions.rows():
+            self.blit(self.explosion_frames[min(max(frame, 0), last)], x, y)
+
+        self.draw_text("Kills: " + str(world.score) + ", Lives: " + str(world.player_sprite.health),
+                       10, 20)
+        return self.frame
+
+    def draw_text(self, text, start_x, start_y):
+        """ White HUD text with its bottom left at start_x, start_y """
+        if text not in self.text:
+            if self.font is None:
+                self.font = hud_font(14)
+            left, top, right, bottom = self.font.getbbox(text)
+            image = PIL.Image.new("RGBA", (right, bottom))
+            PIL.ImageDraw.Draw(image).text((0, 0), text, fill=(255, 255, 255, 255), font=self.font)
+            self.text[text] = SoftwareTexture(image, self.width)
+        texture = self.text[text]
+        self.blit(texture, start_x + texture.width / 2, start_y + texture.height / 2)
+
+    def blit(self, texture, center_x, center_y):
+        """ One sprite, clipped to the frame """
+        left = math.floor(center_x - texture.width / 2 + 0.5)
+        top = self.height - math.floor(center_y + texture.height / 2 + 0.5)
+        x0 = max(left, 0)
+        y0 = max(top, 0)
+        x1 = min(left + texture.width, self.width)
+        y1 = min(top + texture.height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            self.culled += 1
+            return
+        self.drawn += 1
+        source = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+        target = self.frame[y0:y1, x0:x1]
+        if texture.solid:
+            target[...] = texture.rgb[source]
+            return
+        np.copyto(target, texture.rgb[source], where=texture.mask[source])
+        if not len(texture.partial_offsets):
+            return
+
+        pixels = self.pixels
+        if x1 - x0 == texture.width and y1 - y0 == texture.height:
+            # Wholly on screen, the partial pixels are at fixed offsets
+            index = texture.partial_offsets + (top * self.width + left)
+            rgb = texture.partial_rgb
+            inverse = texture.partial_inverse
+        else:
+            ys = texture.partial_y + top
+            xs = texture.partial_x + left
+            inside = (ys >= 0) & (ys < self.height) & (xs >= 0) & (xs < self.width)
+            index = ys[inside] * self.width + xs[inside]
+            rgb = texture.partial_rgb[inside]
+            inverse = texture.partial_inverse[inside]
+        pixels[index] = (rgb + pixels[index] * inverse + 127) // 255
+
+    def stats(self):
+        return {"drawn": self.drawn, "culled": self.culled}
+
+
+def hud_font(size):
+    """ A TrueType font for the HUD if one is installed, else PIL's own """
+    for name in ("arial.ttf", "DejaVuSans.ttf"):
+        try:
+            return PIL.ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return PIL.ImageFont.load_default()
+
+
+class FrameWriter:
+    """
+    Where captured frames go: "-" streams raw RGB24 to stdout for an
+    encoder pipe, a name with a % in it such as "frames/%05d.png" gets one
+    image per frame, and any other name gets the raw RGB24 frames one after
+    another (a file, or a named pipe an encoder reads).
+    """
+
+    def __init__(self, output):
+        self.pattern = None
+        self.stream = None
+        if output == "-":
+            self.stream = sys.stdout.buffer
+        elif "%" in output:
+            self.pattern = output
+        else:
+            self.stream = open(output, "wb")
+        self.output = output
+        self.frames = 0
+
+    def write(self, frame):
+        if self.pattern is not None:
+            # Fast PNG compression, the default level takes far longer than the render
+            PIL.Image.fromarray(frame).save(self.pattern % self.frames, compress_level=1)
+        else:
+            self.stream.write(frame.tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.flush()
+            if self.output != "-":
+                self.stream.close()
+
+
+def capture_frames(world, policy, ticks, writer, fps=30, layers=BACKGROUND_LAYERS):
+    """
+    Step a set up world with policy(world) for up to ticks ticks or until
+    the game ends, rendering a frame every 1 / fps seconds of game time
+    into writer, over the background layers. Only the ticks a frame lands
+    on are rendered.
+    """
+    renderer = SoftwareRenderer(layers=layers)
+    start = time.perf_counter()
+    while True:
+        # Every frame due by now shows this tick
+        while writer.frames / fps <= world.tick * FIXED_DT:
+            writer.write(renderer.draw(world))
+        if world.tick >= ticks or world.game_over:
+            break
+        world.events = []
+        world.step(policy(world))
+    elapsed = time.perf_counter() - start
+    result = {"frames": writer.frames, "ticks": world.tick, "fps": fps,
+              "seconds": round(elapsed, 3),
+              "frames_per_second": round(writer.frames / max(elapsed, 1e-9), 1),
+              "real_time": round(world.tick * FIXED_DT / max(elapsed, 1e-9), 1)}
+    result.update(renderer.stats())
+    return result
+
+
+def capture_game(output, recording=None, policy="random", ticks=None, fps=30,
+                 seed=None, array_backend=False, stage=None, layers=BACKGROUND_LAYERS):
+    """
+    Capture a replayed recording, or a headless game played by one of the
+    POLICIES, to output (see FrameWriter). Returns capture_frames()' stats.
+    """
+    if recording is not None:
+        recording = load_recording(recording)
+        inputs = recording["inputs"]
+        world = recording_world(recording, stage)
+        ticks = min(ticks or len(inputs), len(inputs))
+        play = lambda world: inputs[world.tick]
+    else:
+        world = GameWorld(array_backend, stage)
+        world.setup(seed)
+        ticks = ticks or 7200
+        play = POLICIES[policy](random.Random(world.seed ^ 0x1943))
+    writer = FrameWriter(output)
+    try:
+        return capture_frames(world, play, ticks, writer, fps, layers)
+    finally:
+        writer.close()
+
+
+class MyGame(arcade.Window):
+    """
+    Main application class.
+    """
+
+    def __init__(self, screen_width, screen_height, title, array_backend=False,
+                 seed=None, record_path=None, profile_path=None, stage=None, server=None,
+                 startup_report=False, layers=BACKGROUND_LAYERS, governor=None):
+        """
+        Constructor, server is a (host, port) to play on as a thin client.
+        startup_report prints the STARTUP timings once everything has loaded.
+        layers are the scrolling backgrounds, see BACKGROUND_LAYERS.
+        governor is a FrameGovernor to cap the entities by, when the world
+        is this window's own.
+        """
+        STARTUP.mark("imports")
+        # Call the parent constructor. Required and must be the first line.
+        super().__init__(screen_width, screen_height, title)
+        STARTUP.mark("window")
+
+        # Set the working directory (where we expect to find files) to the same
+        # directory this .py file is in. You can leave this out of your own
+        # code, but it is needed to easily run the examples using "python -m"
+        # as mentioned at the top of this program.
+        file_path = os.path.dirname(os.path.abspath(__file__))
+        os.chdir(file_path)
+
+        # The game logic, built when the first game starts, or the
+        # stand-in for a GameServer's when playing on one
+        self.array_backend = array_backend
+        self.stage = stage
+        self.server = server
+        self.world = None
+        self.seed = seed
+        self.record_path = record_path
+        self.layers = layers
+
+        # Frame timings, toggled with F3 and saved to profile_path
+        self.profiler = FrameProfiler(enabled=profile_path is not None)
+        self.profile_path = profile_path or "profile.csv"
+
+        # What updating cost this frame, for the governor
+        self.governor = governor if server is None else None
+        self.update_ms = 0.0
+
+        # Load the sounds, named by the world events that trigger them
+        self.mixer = AudioMixer("images/midway",
+                                {"shoot": "Shot.wav",
+                                 "explode": "explode.wav",
+                                 "powerup": "powerup.wav",
+                                 "gameover": "gameover.wav"},
+                                "background.wav")
+
+        # Only the start screen is needed for the first frame; the images and
+        # sounds load on a background thread once it is up, so the loading
+        # doesn't hold up the first frame for the GIL
+        self.loader = StartupLoader()
+        self.loader.add("images", ASSETS.load)
+        self.loader.add("sounds", self.mixer.load)
+        self.startup_report = startup_report
+
+        # Play background music, once it has loaded
+        self.mixer.play_music()
+        
+    # STEP 2: Add this function.
+        # Set the background color
+        arcade.set_background_color(arcade.color.WHITE)
+
+        # Start 'state' will be showing the first page of instructions.
+        self.current_state = START_SCREEN
+
+        # Timed events, driven by update()'s delta_time
+        self.scheduler = Scheduler()
+
+        # Keys held down, and a J press waiting for the next world step
+        self.keys = 0
+        self.fire_pending = False
+
+        # SPACE pressed before the loader finished, the game starts when it has
+        self.start_pending = False
+        # Likewise F9, the quicksave is loaded once the loader has finished
+        self.quickload_pending = False
+        self.loading_list = arcade.SpriteList()
+        self.loading_text = None
+
+        # STEP 1: Put each instruction page in an image. Make sure the image
+        # matches the dimensions of the window, or it will stretch and look
+        # ugly. You can also do something similar if you want a page between
+        # each level.
+        self.instructions = ["images/midway/Logo1.png", "images/midway/Logo2.png"]
+
+        # Menu screens as single sprite lists, built the first time they show
+        self.screens = {}
+
+        # Last game snapshot taken with F5
+        self.quicksave_data = None
+
+    def setup(self):
+        """
+        Set up the game.
+        """
+        if self.world is None:
+            if self.server is not None:
+                self.world = RemoteWorld(self.server)
+            else:
+                self.world = GameWorld(self.array_backend, self.stage)
+            self.world.profiler = self.profiler
+            self.explosion_renderer = ExplosionRenderer(self.world.explosions)
+            self.background = ScrollingBackground(self.world, self.layers)
+        self.world.setup(self.seed)
+        self.scheduler.clear()
+        self.keys = 0
+        self.fire_pending = False
+
+        self.interval = 60
+        self.interval_counter = 0
+        self.build_layers()
+
+        # Don't show the mouse cursor
+        self.set_mouse_visible(False)
+
+    def build_layers(self):
+        """ Layers of the game scene, back to front, one draw call each """
+        world = self.world
+        self.actors = arcade.SpriteList()
+        hud = arcade.SpriteList()
+        self.score_text = CachedText(hud, 10, 20, arcade.color.WHITE, 14)
+        self.render_queue = RenderQueue()
+        self.render_queue.add("background", self.background)
+        self.render_queue.add("clouds", world.cloud_list)
+        self.render_queue.add("enemies", world.enemy_list)
+        self.render_queue.add("reds", world.red_list)
+        self.render_queue.add("bullets", world.bullet_list)
+        self.render_queue.add("actors", self.actors)
+        self.render_queue.add("explosions", self.explosion_renderer)
+        self.render_queue.add("hud", hud)
+
+    def quicksave(self):
+        """ Keep a snapshot of the game, in memory and in QUICKSAVE_FILE """
+        self.quicksave_data = self.world.snapshot()
+        with open(QUICKSAVE_FILE, "wb") as f:
+            f.write(self.quicksave_data)
+
+    def quickload(self):
+        """ Go back to the last quicksave, from this session or an earlier one """
+        data = self.quicksave_data
+        if data is None:
+            if not os.path.exists(QUICKSAVE_FILE):
+                return
+            with open(QUICKSAVE_FILE, "rb") as f:
+                data = f.read()
+        # A file from another build or entity backend must leave things be
+        state = self.current_state
+        backup = self.world.snapshot() if self.world is not None else None
+        if self.world is None or state != GAME_RUNNING:
+            self.current_state = GAME_RUNNING
+            self.setup()
+        try:
+            self.world.restore(data)
+        except (ValueError, struct.error) as error:
+            print("Can't quickload %s: %s" % (QUICKSAVE_FILE, error), file=sys.stderr)
+            if backup is not None:
+                self.world.restore(backup)
+            # setup() dropped the pending game over screen, show it now
+            self.current_state = GAME_OVER if state == GAME_OVER_PENDING else state
+            self.set_mouse_visible(state != GAME_RUNNING)
+            self.build_layers()
+            return
+        if state != GAME_RUNNING:
+            self.mixer.play_music()
+        self.build_layers()
+        if self.world.game_over:
+            self.current_state = GAME_OVER
+            self.set_mouse_visible(True)
+
+    def page_sprite(self, page_number):
+        """
+        A sprite of an instruction page, filling the window.
+        """
+        page = arcade.Sprite()
+        page.texture = ASSETS.loose_texture(self.instructions[page_number])
+        page.center_x = SCREEN_WIDTH // 2
+        page.center_y = SCREEN_HEIGHT // 2
+        return page
+
+    def build_screen(self, state):
+        """
+        The page, logo and text of a menu screen in one sprite list, so the
+        whole screen is a single draw call.
+        """
+        screen = arcade.SpriteList()
+        if state == START_SCREEN:
+            screen.append(self.page_sprite(0))
+            logo_1943 = arcade.Sprite()
+            logo_1943.texture = ASSETS.loose_texture("images/midway/1943Logo.png")
+            logo_1943.center_x  = SCREEN_WIDTH // 2
+            logo_1943.center_y  = 500
+            screen.append(logo_1943)
+            output = "The Battle of Midway"
+            texts = [(output, 40, 360, arcade.color.BLACK, 44, True),
+                     (output, 45, 365, arcade.color.WHITE, 44, True)]
+            output = "Press Enter for Keys"
+            texts += [(output, 272, 117, arcade.color.BLACK, 24),
+                      (output, 275, 120, arcade.color.WHITE, 24)]
+            output = "Press SPACE to play"
+            texts += [(output, 272, 87, arcade.color.BLACK, 24),
+                      (output, 275, 90, arcade.color.WHITE, 24)]
+
+        elif state == INSTRUCTIONS:
+            screen.append(self.page_sprite(1))
+            output = "W: up, S: down, A: left, D: right, J: fire"
+            texts = [(output, 50, 342, arcade.color.BLACK, 24),
+                     (output, 48, 344, arcade.color.WHITE, 24)]
+            output = "Press SPACE to play"
+            texts += [(output, 150, 286, arcade.color.BLACK, 24),
+                      (output, 148, 288, arcade.color.WHITE, 24)]
+
+        else:
+            # "Game over" across the screen
+            screen.append(self.page_sprite(1))
+            texts = [("Game Over", 150, 322, arcade.color.BLACK, 44),
+                     ("Press SPACE to restart", 145, 40, arcade.color.BLACK, 24)]
+
+        for text in texts:
+            screen.append(text_sprite(*text))
+        return screen
+
+    def draw_screen(self, state):
+        if state not in self.screens:
+            self.screens[state] = self.build_screen(state)
+        self.screens[state].draw()
+
+    # STEP 3: Add this function
+    def draw_game_over(self):
+        """
+        Draw "Game over" across the screen.
+        """
+        self.draw_screen(GAME_OVER)
+
+    # STEP 4: Take the drawing code you currently have in your
+    # on_draw method AFTER the start_render call and MOVE to a new
+    # method called draw_game.
+    def draw_game(self):
+        """
+        Draw all the sprites, along with the score.
+        """
+        world = self.world
+        profiler = self.profiler
+        profiler.start()
+        world.sync_sprites()
+
+        # The world only drops the carrier and the powerup from its own lists,
+        # they stay on screen; the player goes once out of lives
+        actors = [world.enemy_sprite, world.power_sprite]
+        if world.player_sprite.health > 0:
+            actors.insert(0, world.player_sprite)
+        if list(self.actors) != actors:
+            while len(self.actors):
+                self.actors.pop()
+            for sprite in actors:
+                self.actors.append(sprite)
+
+        # 画得分情况
+        self.score_text.set("Kills: " + str(world.score) + ", Lives: " + str(world.player_sprite.health))
+        profiler.lap("draw_sync")
+
+        self.render_queue.draw(profiler)
+
+        if profiler.enabled:
+            self.draw_profiler_overlay()
+
+        if world.player_sprite.health < 1:  # end of game
+           self.interval_counter +=1
+           if self.interval_counter % self.interval == 0: self.interval_counter = 0
+
+    def draw_profiler_overlay(self):
+        """ Frame time percentiles and entity counts in the top left corner """
+        p50, p99 = self.profiler.percentiles()
+        counts = self.world.entity_counts()
+        lines = ["frame p50 %.1f ms  p99 %.1f ms" % (p50, p99),
+                 "enemies %(enemies)d  bullets %(bullets)d  explosions %(explosions)d" % counts,
+                 "voices %(voices)d  played %(played)d  coalesced %(coalesced)d  dropped %(dropped)d"
+                 % self.mixer.stats()]
+        # A thin client has no pools, the server does
+        if self.server is None:
+            pools = self.world.pool_stats()
+            lines.append("bullet pool %(active)d/%(size)d  misses %(misses)d  dropped %(dropped)d"
+                         % pools["bullets"])
+            lines.append("explosions peak %(peak)d/%(capacity)d  dropped %(dropped)d"
+                         % pools["explosions"])
+        if self.governor is not None:
+            lines.append("budget level %d of %d" % (self.governor.level,
+                                                    len(self.governor.levels) - 1))
+        for i, line in enumerate(lines):
+            arcade.draw_text(line, 10, SCREEN_HEIGHT - 20 - 16 * i, arcade.color.YELLOW, 11)
+
+    # STEP 5: Update the on_draw function to look like this. Adjust according
+    # to the number of instruction pages you have.
+    def on_draw(self):
+        """
+        Render the screen.
+        """
+
+        # This command has to happen before we start drawing
+        arcade.start_render()
+
+        if self.current_state == START_SCREEN or self.current_state == INSTRUCTIONS:
+            self.draw_screen(self.current_state)
+            if self.start_pending or self.quickload_pending:
+                self.draw_loading()
+
+        elif self.current_state == GAME_RUNNING or self.current_state == GAME_OVER_PENDING:
+            start = time.perf_counter()
+            self.draw_game()
+            if self.governor is not None and self.current_state == GAME_RUNNING:
+                draw_ms = (time.perf_counter() - start) * 1000
+                self.governor.frame(self.world, self.update_ms, draw_ms)
+            self.update_ms = 0.0
+
+        else:
+            self.draw_game()
+            self.draw_game_over()
+
+        if self.world is not None:
+            self.profiler.end_frame(**self.world.entity_counts())
+        if self.loader.thread is None:
+            STARTUP.mark("first_frame")
+            self.loader.start()
+
+    def draw_loading(self):
+        """ "Loading..." while a game waits for the loader """
+        if self.loading_text is None:
+            self.loading_text = CachedText(self.loading_list, 10, 20, arcade.color.WHITE, 14)
+            self.loading_text.set("Loading...")
+        self.loading_list.draw()
+
+    def on_close(self):
+        """ Save the frame trace, if profiling, before the window goes """
+        if self.profiler.enabled:
+            self.profiler.export(self.profile_path)
+        if self.server is not None and self.world is not None:
+            self.world.close()
+        super().on_close()
+
+    # STEP 6: Do something like adding this to your on_mouse_press to flip
+    # between instruction pages.
+    def on_mouse_press(self, x, y, button, modifiers):
+        """
+        Called when the user presses a mouse button.
+        """
+        # Change states as needed.
+
+    def on_mouse_motion(self, x, y, dx, dy):
+        """
+        Called whenever the mouse moves.
+        """
+        # Only move the user if the game is running.
+        #if self.current_state == GAME_RUNNING:
+        #    self.player_sprite.center_x = x
+        #    self.player_sprite.center_y = y
+
+    def on_key_press(self, key, modifiers):
+        """ Key button events """
+        if key == arcade.key.ENTER:
+            self.mixer.play("explode")
+            if self.current_state == START_SCREEN:
+                self.current_state = INSTRUCTIONS
+            elif self.current_state == INSTRUCTIONS:
+                self.current_state = START_SCREEN
+            elif self.current_state == GAME_OVER:
+                self.current_state = INSTRUCTIONS
+        if key == arcade.key.SPACE and self.current_state in (START_SCREEN, INSTRUCTIONS, GAME_OVER):
+            if self.loader.done():
+                self.start_game()
+            else:
+                self.start_pending = True
+
+        if key == arcade.key.F3:
+            # Profiling off writes out the trace recorded so far
+            if self.profiler.enabled:
+                self.profiler.export(self.profile_path)
+            self.profiler.enabled = not self.profiler.enabled
+
+        # Snapshots are the server's business when playing on one
+        if key == arcade.key.F5 and self.current_state == GAME_RUNNING and self.server is None:
+            self.quicksave()
+        if key == arcade.key.F9 and self.server is None:
+            if self.loader.done():
+                self.quickload()
+            else:
+                self.quickload_pending = True
+
+        if key in KEY_BITS:
+            self.keys |= KEY_BITS[key]
+        if key == arcade.key.J:
+            self.fire_pending = True
+
+    def on_key_release(self, key, modifiers):
+        """ Key release event """
+        if key in KEY_BITS:
+            self.keys &= ~KEY_BITS[key]
+
+    # STEP 7: Only update if the game state is GAME_RUNNING like below:
+    def update(self, delta_time):
+        """ Movement and game logic """
+        # Animate the player on the start screen
+        if self.current_state == START_SCREEN and self.world is not None:
+            self.world.player_sprite.update()
+            self.world.player_sprite.update_animation()
+
+        self.scheduler.update(delta_time)
+
+        # The readiness gate: a game asked for while loading starts now
+        if self.start_pending and self.loader.done():
+            self.start_pending = False
+            self.start_game()
+        if self.quickload_pending and self.loader.done():
+            self.quickload_pending = False
+            self.quickload()
+        if self.startup_report and self.loader.done() and "first_frame" in STARTUP.marks:
+            print(json.dumps(STARTUP.report()), file=sys.stderr)
+            self.startup_report = False
+
+        # Only move and do things if the game is running.
+        if self.current_state == GAME_RUNNING or self.current_state == GAME_OVER_PENDING:
+            inputs = self.keys
+            if self.fire_pending:
+                inputs |= KEY_FIRE
+            start = time.perf_counter()
+            if self.world.advance(delta_time, inputs):
+                self.fire_pending = False
+            self.update_ms += (time.perf_counter() - start) * 1000
+
+            for event in self.world.events:
+                self.mixer.play(event)
+
+            if self.world.game_over and self.current_state == GAME_RUNNING:
+                if self.record_path and self.server is None:
+                    save_recording(self.world, self.record_path)
+                self.current_state = GAME_OVER_PENDING
+                self.mixer.stop_music()
+                self.scheduler.schedule(GAME_OVER_DELAY, self.show_game_over)
+
+        # Start this frame's sounds
+        self.profiler.start()
+        self.mixer.flush()
+        self.profiler.lap("sound")
+
+    def start_game(self):
+        self.current_state = GAME_RUNNING
+        self.setup()
+
+    def show_game_over(self):
+        """ The game over delay is up """
+        self.current_state = GAME_OVER
+        self.set_mouse_visible(True)
+
+
+# Keyboard controls and the input bits they set
+KEY_BITS = {arcade.key.W: KEY_UP,
+            arcade.key.S: KEY_DOWN,
+            arcade.key.A: KEY_LEFT,
+            arcade.key.D: KEY_RIGHT}
+
+
+def run_headless(ticks, policy=None, array_backend=False, seed=None):
+    """
+    Play one game with no window for up to ticks fixed steps and return the
+    world. policy(world) returns the KEY_* inputs for each step.
+    """
+    world = GameWorld(array_backend)
+    world.setup(seed)
+    for _ in range(ticks):
+        world.events = []
+        world.step(policy(world) if policy else 0)
+        if world.game_over:
+            break
+    return world
+
+
+def idle_policy(rng):
+    """ Never touch the keys """
+    return lambda world: 0
+
+
+def fire_policy(rng):
+    """ Stay put and fire six times a second """
+    return lambda world: KEY_FIRE if world.tick % 10 == 0 else 0
+
+
+def sweep_policy(rng):
+    """ Strafe across the screen a second each way, firing """
+    def policy(world):
+        inputs = KEY_LEFT if world.tick // 60 % 2 else KEY_RIGHT
+        if world.tick % 8 == 0:
+            inputs |= KEY_FIRE
+        return inputs
+    return policy
+
+
+def random_policy(rng):
+    """ Mash a random direction every quarter second, firing at random """
+    directions = [0, KEY_UP, KEY_DOWN, KEY_LEFT, KEY_RIGHT,
+                  KEY_UP | KEY_LEFT, KEY_UP | KEY_RIGHT,
+                  KEY_DOWN | KEY_LEFT, KEY_DOWN | KEY_RIGHT]
+    held = [0]
+
+    def policy(world):
+        if world.tick % 15 == 0:
+            held[0] = rng.choice(directions)
+        return held[0] | (KEY_FIRE if rng.random() < 0.2 else 0)
+    return policy
+
+
+# Input policies for batch runs, made fresh for each game from its own RNG
+POLICIES = {"idle": idle_policy,
+            "fire": fire_policy,
+            "sweep": sweep_policy,
+            "random": random_policy}
+
+
+def simulate_game(job):
+    """
+    Play one headless batch game and return its BATCH_RECORD fields.
+    Runs in the worker processes of run_batch().
+    """
+    seed, policy_name, ticks, enemy_count, lives, movement_speed, array_backend = job
+    policy = POLICIES[policy_name](random.Random(seed ^ 0x1943))
+    world = GameWorld(array_backend)
+    world.setup(seed, enemy_count, lives, movement_speed)
+    for _ in range(ticks):
+        world.events = []
+        world.step(policy(world))
+        if world.game_over:
+            break
+    return seed, world.tick, world.score, world.player_sprite.health
+
+
+def run_batch(path, games, policy="random", ticks=7200, first_seed=0, workers=None,
+              enemy_count=ENEMY_COUNT, lives=PLAYER_LIVES, movement_speed=MOVEMENT_SPEED,
+              array_backend=False):
+    """
+    Play games headless with seeds first_seed, first_seed + 1, ...
+    across a pool of worker processes, one per core unless workers is given.
+    Each result is appended to path as soon as its game finishes.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = [(seed, policy, ticks, enemy_count, lives, movement_speed, array_backend)
+            for seed in range(first_seed, first_seed + games)]
+    # Small chunks keep the cores busy to the end, as game lengths vary a lot
+    chunksize = max(1, games // (workers * 16))
+
+    # Decode the sprites once here so forked workers share them
+    ASSETS.load()
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        f.write(BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, ticks, enemy_count,
+                                  lives, movement_speed, policy.encode()))
+        with multiprocessing.Pool(workers) as pool:
+            for done, result in enumerate(pool.imap_unordered(simulate_game, jobs, chunksize), 1):
+                f.write(BATCH_RECORD.pack(*result))
+                if done % 100 == 0:
+                    f.flush()
+                    print("%d/%d games" % (done, games), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print("%d games in %.1f s on %d workers, %.1f games/s"
+          % (games, elapsed, workers, games / elapsed), file=sys.stderr)
+
+
+def load_batch(path):
+    """ Read a batch results file back into its settings and list of games """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, ticks, enemy_count, lives, movement_speed, policy = \
+        BATCH_HEADER.unpack_from(data)
+    if magic != BATCH_MAGIC or version != BATCH_VERSION:
+        raise ValueError("%s is not a version %d batch file" % (path, BATCH_VERSION))
+    settings = {"policy": policy.rstrip(b"\0").decode(), "ticks": ticks,
+                "enemies": enemy_count, "lives": lives, "movement_speed": movement_speed}
+    # A run cut short leaves a partial record at the end
+    end = len(data) - (len(data) - BATCH_HEADER.size) % BATCH_RECORD.size
+    games = list(BATCH_RECORD.iter_unpack(data[BATCH_HEADER.size:end]))
+    return settings, games
+
+
+def distribution(values):
+    """ Mean and percentiles of a list of numbers """
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def percentile(p):
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    return {"mean": sum(values) / len(values), "min": values[0],
+            "p10": percentile(10), "p50": percentile(50), "p90": percentile(90),
+            "max": values[-1]}
+
+
+def summarize_batch(path):
+    """ Score and survival time distributions of a batch results file """
+    settings, games = load_batch(path)
+    summary = dict(settings)
+    summary["games"] = len(games)
+    summary["survived"] = sum(1 for seed, ticks, score, lives in games if lives > 0)
+    summary["score"] = distribution([score for seed, ticks, score, lives in games])
+    summary["survival_seconds"] = distribution([ticks * FIXED_DT for seed, ticks, score, lives in games])
+    return summary
+
+
+class GameEnv:
+    """
+    Reinforcement learning environment around a headless GameWorld, in the
+    style of Gym: reset() returns an observation and step(action) returns
+    the observation, reward, done and an info dict. An action indexes
+    ACTIONS and is held for frame_skip ticks, J firing once. The reward is
+    the kills scored, less LIFE_PENALTY for each life lost.
+
+    Observations are dicts of float32 arrays. "player" is x, y, lives and
+    powerup. "entities" is the OBS_ENTITIES nearest enemies on screen, each
+    kind (1 fighter, 2 red, 3 carrier, 4 powerup, 0 for empty rows), dx and
+    dy from the player, and its speed per tick, all as fractions of the
+    screen's width and height. With frame=True, "frame" is
+    a coarse top-down view: player 1.0, enemies 0.5, bullets 0.25.
+    """
+
+    def __init__(self, frame_skip=4, max_ticks=7200, frame=False,
+                 array_backend=False, stage=None, enemy_count=None):
+        if np is None:
+            raise ImportError("GameEnv needs numpy")
+        self.frame_skip = frame_skip
+        self.max_ticks = max_ticks
+        self.frame = frame
+        self.enemy_count = enemy_count
+        self.world = GameWorld(array_backend, stage)
+
+    def new_observation(self, batch=()):
+        """ Zeroed observation arrays, with batch as leading dimensions """
+        obs = {"player": np.zeros(batch + (4,), np.float32),
+               "entities": np.zeros(batch + (OBS_ENTITIES, 5), np.float32)}
+        if self.frame:
+            obs["frame"] = np.zeros(batch + OBS_FRAME_SHAPE, np.float32)
+        return obs
+
+    def reset(self, seed=None):
+        """ Start a new game and return its first observation """
+        self.world.setup(seed, self.enemy_count)
+        obs = self.new_observation()
+        self.observe(obs)
+        return obs
+
+    def step(self, action):
+        """ Play one action, return (observation, reward, done, info) """
+        reward, done, info = self.play(action)
+        obs = self.new_observation()
+        self.observe(obs)
+        return obs, reward, done, info
+
+    def play(self, action):
+        """ Play one action without observing, return (reward, done, info) """
+        world = self.world
+        score, lives = world.score, world.player_sprite.health
+        inputs = ACTIONS[action]
+        for _ in range(self.frame_skip):
+            world.events = []
+            world.step(inputs)
+            inputs &= ~KEY_FIRE
+            if world.game_over:
+                break
+        reward = world.score - score - LIFE_PENALTY * (lives - world.player_sprite.health)
+        truncated = not world.game_over and world.tick >= self.max_ticks
+        info = {"score": world.score, "lives": world.player_sprite.health,
+                "tick": world.tick, "truncated": truncated}
+        return reward, world.game_over or truncated, info
+
+    def enemies(self):
+        """ Kinds, positions and speeds of the enemies on screen, as arrays """
+        world = self.world
+        # The world moves these by the constant speed of their kind
+        sprites = [(2, RED_SPEED, sprite) for sprite in world.red_list]
+        # The carrier and the powerup stay on screen once shot or taken
+        if not world.enemy_shot:
+            sprites.append((3, CARRIER_SPEED, world.enemy_sprite))
+        if world.powerup:
+            sprites.append((4, POWERUP_SPEED, world.power_sprite))
+        if world.enemy_store is None:
+            sprites.extend((1, FIGHTER_SPEED, sprite) for sprite in world.enemy_list)
+        values = np.array([(kind, sprite.center_x, sprite.center_y, change_x, change_y)
+                           for kind, (change_x, change_y), sprite in sprites],
+                          np.float32).reshape(-1, 5)
+        if world.enemy_store is not None:
+            store = world.enemy_store
+            slots = store.live()
+            stored = np.ones((len(slots), 5), np.float32)
+            stored[:, 1] = store.x[slots]
+            stored[:, 2] = store.y[slots]
+            stored[:, 3] = store.change_x[slots]
+            stored[:, 4] = store.change_y[slots]
+            values = np.concatenate((values, stored))
+        on_screen = ((values[:, 1] >= 0) & (values[:, 1] < SCREEN_WIDTH) &
+                     (values[:, 2] >= 0) & (values[:, 2] < SCREEN_HEIGHT))
+        return values[on_screen]
+
+    def bullets(self):
+        """ x and y arrays of the bullets in flight """
+        world = self.world
+        if world.bullet_store is not None:
+            slots = world.bullet_store.live()
+            return world.bullet_store.x[slots], world.bullet_store.y[slots]
+        xy = np.array([(bullet.center_x, bullet.center_y) for bullet in world.bullet_list],
+                      np.float32).reshape(-1, 2)
+        return xy[:, 0], xy[:, 1]
+
+    def observe(self, obs):
+        """ Write the current observation into the arrays of obs """
+        world = self.world
+        player = world.player_sprite
+        px, py = player.center_x, player.center_y
+        obs["player"][:] = (px / SCREEN_WIDTH, py / SCREEN_HEIGHT,
+                            player.health / PLAYER_LIVES, world.powerup)
+
+        enemies = self.enemies()
+        enemies[:, 1] -= px
+        enemies[:, 2] -= py
+        nearest = np.argsort(enemies[:, 1] ** 2 + enemies[:, 2] ** 2)[:OBS_ENTITIES]
+        rows = obs["entities"]
+        rows[:] = 0
+        rows[:len(nearest)] = enemies[nearest]
+        rows[:len(nearest), 1:5:2] /= SCREEN_WIDTH
+        rows[:len(nearest), 2:5:2] /= SCREEN_HEIGHT
+
+        if self.frame:
+            frame = obs["frame"]
+            frame[:] = 0
+            for (x, y), value in ((self.bullets(), 0.25),
+                                  ((enemies[:, 1] + px, enemies[:, 2] + py), 0.5),
+                                  (([px], [py]), 1.0)):
+                cols = np.clip(np.asarray(x, np.int32) // OBS_FRAME_SCALE, 0, OBS_FRAME_SHAPE[1] - 1)
+                rows = np.clip(np.asarray(y, np.int32) // OBS_FRAME_SCALE, 0, OBS_FRAME_SHAPE[0] - 1)
+                frame[OBS_FRAME_SHAPE[0] - 1 - rows, cols] = value
+
+
+class VectorEnv:
+    """
+    count GameEnvs stepped together. Observations are the GameEnv arrays
+    with a leading env dimension, rewards and dones are arrays. An env that
+    finishes starts its next game straight away, so its observation is the
+    first of the new game; its info still holds the finished game's result.
+
+    With workers, the envs are split between that many worker processes
+    that play their share at the same time and observe straight into
+    shared memory. The games and seeds are the same as in one process.
+    close() stops the workers.
+    """
+
+    def __init__(self, count, workers=None, **kwargs):
+        self.count = count
+        self.next_seed = None
+        self.connections = []
+        self.processes = []
+        self.slices = []
+        if not workers or workers < 2:
+            self.envs = [GameEnv(**kwargs) for _ in range(count)]
+            self.obs = self.envs[0].new_observation((count,))
+            return
+
+        # Observation arrays in shared memory, as (buffer, dtype, shape)
+        self.envs = []
+        template = GameEnv(**kwargs).new_observation((count,))
+        buffers = {name: (multiprocessing.RawArray("b", values.nbytes), values.dtype.str,
+                          values.shape)
+                   for name, values in template.items()}
+        self.obs = {name: shared_array(*buffer) for name, buffer in buffers.items()}
+        # Decode the sprites once here so forked workers share them
+        ASSETS.load()
+        workers = min(workers, count)
+        for i in range(workers):
+            first, last = count * i // workers, count * (i + 1) // workers
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=vector_env_worker, daemon=True,
+                                              args=(child, first, last, buffers, kwargs))
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+            self.slices.append((first, last))
+
+    def view(self, index):
+        return {name: values[index] for name, values in self.obs.items()}
+
+    def reset(self, seed=None):
+        """ Start every env, on seed, seed + 1, ... if given """
+        self.next_seed = seed
+        self.restart(range(self.count))
+        return self.obs
+
+    def step(self, actions):
+        """ Play one action per env, return (observations, rewards, dones, infos) """
+        if not self.connections:
+            rewards, dones, infos = self.play(actions)
+        else:
+            for connection, (first, last) in zip(self.connections, self.slices):
+                connection.send(("play", actions[first:last]))
+            results = [connection.recv() for connection in self.connections]
+            rewards = np.concatenate([result[0] for result in results])
+            dones = np.concatenate([result[1] for result in results])
+            infos = [info for result in results for info in result[2]]
+        self.restart(np.flatnonzero(dones))
+        return self.obs, rewards, dones, infos
+
+    def restart(self, indices):
+        """ Start the next games of the envs at indices, on the next seeds """
+        starts = []
+        for index in indices:
+            starts.append((int(index), self.next_seed))
+            if self.next_seed is not None:
+                self.next_seed += 1
+        if not self.connections:
+            self.start(starts)
+            return
+        waiting = []
+        for connection, (first, last) in zip(self.connections, self.slices):
+            mine = [(index - first, seed) for index, seed in starts if first <= index < last]
+            if mine:
+                connection.send(("start", mine))
+                waiting.append(connection)
+        for connection in waiting:
+            connection.recv()
+
+    def start(self, starts):
+        """ Set up and observe a game per (env index, seed) of this process """
+        for index, seed in starts:
+            env = self.envs[index]
+            env.world.setup(seed, env.enemy_count)
+            env.observe(self.view(index))
+
+    def play(self, actions):
+        """ Play one action per env of this process, observing the unfinished """
+        rewards = np.zeros(len(self.envs), np.float32)
+        dones = np.zeros(len(self.envs), bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            rewards[i], dones[i], info = env.play(action)
+            infos.append(info)
+            if not dones[i]:
+                env.observe(self.view(i))
+        return rewards, dones, infos
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+
+def shared_array(buffer, dtype, shape):
+    """ A NumPy array over a multiprocessing.RawArray """
+    return np.frombuffer(buffer, dtype).reshape(shape)
+
+
+def vector_env_worker(connection, first, last, buffers, kwargs):
+    """
+    Plays envs first to last of a VectorEnv in a worker process, as a
+    VectorEnv of its own whose observations are its slice of the shared
+    arrays. Runs "play" and "start" commands until "close".
+    """
+    envs = VectorEnv(last - first, **kwargs)
+    envs.obs = {name: shared_array(*buffer)[first:last] for name, buffer in buffers.items()}
+    while True:
+        command, argument = connection.recv()
+        if command == "close":
+            break
+        connection.send(getattr(envs, command)(argument))
+    connection.close()
+
+
+def run_env_benchmark(count=16, workers=None, frame_skip=4, seconds=5.0, array_backend=False):
+    """
+    Steps per second of a VectorEnv of count envs taking random actions,
+    summed over the envs
+    """
+    envs = VectorEnv(count, workers, frame_skip=frame_skip, array_backend=array_backend)
+    rng = np.random.default_rng(1943)
+    envs.reset(seed=0)
+    steps = 0
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < seconds:
+            envs.step(rng.integers(len(ACTIONS), size=count))
+            steps += count
+    finally:
+        envs.close()
+    elapsed = time.perf_counter() - start
+    return {"envs": count, "workers": workers or 1, "frame_skip": frame_skip,
+            "array_backend": array_backend, "steps": steps, "seconds": round(elapsed, 3),
+            "steps_per_second": round(steps / elapsed, 1),
+            "ticks_per_second": round(steps * frame_skip / elapsed, 1)}
+
+
+def encode_frame(world):
+    """
+    What a thin client needs to draw the world: FRAME_HEADER fields, and a
+    body of int16 values. The body holds x, y and texture of the player, the
+    carrier and the powerup, then x, y and cloud image of every cloud, x and
+    y of every fighter, red and bullet, and x, y and frame shown of every
+    explosion. The background follows the tick, so it isn't sent.
+    """
+    world.sync_sprites()
+    body = array.array("h")
+    for sprite in (world.player_sprite, world.enemy_sprite, world.power_sprite):
+        body.extend((round(sprite.center_x), round(sprite.center_y), sprite.cur_texture_index))
+    cloud_kinds = {ASSETS.texture(image): i for i, image in enumerate(CLOUD_IMAGES)}
+    for sprite in world.cloud_list:
+        body.extend((round(sprite.center_x), round(sprite.center_y), cloud_kinds[sprite.texture]))
+    for sprite_list in (world.enemy_list, world.red_list, world.bullet_list):
+        for sprite in sprite_list:
+            body.extend((round(sprite.center_x), round(sprite.center_y)))
+    for x, y, frame in world.explosions.rows():
+        body.extend((round(x), round(y), frame))
+    fields = [world.tick, world.explosions.time, world.score, world.player_sprite.health,
+              FRAME_GAME_OVER if world.game_over else 0, 0,
+              len(world.cloud_list), len(world.enemy_list), len(world.red_list),
+              len(world.bullet_list), len(world.explosions)]
+    return fields, body.tobytes()
+
+
+def frame_delta(body, base, sign=-1):
+    """
+    body's int16 values less the ones at the same places in base, or with
+    them added back for sign 1. Whole groups of sprites move the same few
+    pixels every tick, so the delta repeats a handful of small values and
+    compresses far better than the body itself.
+    """
+    values = array.array("H", body)
+    old = array.array("H", base[:len(body)])
+    values[:len(old)] = array.array("H", [(value + sign * last) & 0xFFFF
+                                          for value, last in zip(values, old)])
+    return values.tobytes()
+
+
+def encode_frame_payload(fields, body, base):
+    """ A MSG_FRAME payload, the body a delta on base unless base is None """
+    fields = list(fields)
+    if base is None:
+        fields[4] |= FRAME_KEY
+        base = b""
+    deflate = zlib.compressobj(1, zlib.DEFLATED, -15)
+    return FRAME_HEADER.pack(*fields) + deflate.compress(frame_delta(body, base)) + deflate.flush()
+
+
+def decode_frame(payload, base):
+    """ The FRAME_HEADER fields and body of a MSG_FRAME, given the last body """
+    fields = FRAME_HEADER.unpack_from(payload)
+    body = zlib.decompress(payload[FRAME_HEADER.size:], -15)
+    if not fields[4] & FRAME_KEY:
+        body = frame_delta(body, base, 1)
+    return fields, body
+
+
+async def read_message(reader):
+    """ The next (type, payload) from an asyncio stream """
+    kind, size = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError("message of %d bytes is over the limit" % size)
+    return kind, await reader.readexactly(size)
+
+
+def message(kind, payload=b""):
+    return MESSAGE_HEADER.pack(kind, len(payload)) + payload
+
+
+class ServerSession:
+    """ One game on a GameServer, and the clients playing or watching it """
+
+    def __init__(self, session_id, world):
+        self.id = session_id
+        self.world = world
+        self.clients = set()
+        self.inputs = 0             # Keys held
+        self.fire = False           # A J press waiting for the next step
+        self.events = 0             # EVENT_BITS since the last frame sent
+        self.sent_tick = None       # World tick of the last frame sent
+
+    def step(self):
+        inputs = self.inputs
+        if self.fire:
+            inputs |= KEY_FIRE
+            self.fire = False
+        world = self.world
+        world.events = []
+        world.step(inputs)
+        for event in world.events:
+            self.events |= EVENT_BITS[event]
+
+
+class ServerClient:
+    """ A connection to a GameServer, and the last frame body sent down it """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.session = None
+        self.session_id = None
+        self.frame = None           # None until the next frame goes out whole
+        self.frames = 0
+        self.skipped = 0
+
+    def send(self, kind, payload=b""):
+        self.writer.write(message(kind, payload))
+
+    def send_frame(self, fields, body):
+        """ Send a frame as a delta on the last one, returns the bytes sent """
+        if self.writer.transport.get_write_buffer_size() > MAX_CLIENT_BACKLOG:
+            # Falling behind: skip frames, and start again from a whole one
+            self.frame = None
+            self.skipped += 1
+            return 0
+        payload = encode_frame_payload(fields, body, self.frame)
+        self.send(MSG_FRAME, payload)
+        self.frame = body
+        self.frames += 1
+        return MESSAGE_HEADER.size + len(payload)
+
+
+class GameServer:
+    """
+    Hosts many independent games on one asyncio loop with no window. Every
+    FIXED_DT tick it steps each session's GameWorld once, from the W/A/S/D/J
+    inputs its clients sent, and every snapshot_interval ticks it sends each
+    client a frame of what to draw (see encode_frame()) as a compressed
+    delta on the frame before.
+
+    The world steps of a tick stop once they have taken tick_budget seconds.
+    The sessions left out are stepped first on the next tick, so when the
+    server is overloaded every game slows down a little, in turn, instead of
+    the ticks falling behind; a world never runs more than one step a tick.
+    """
+
+    def __init__(self, host="127.0.0.1", port=SERVER_PORT, array_backend=False, stage=None,
+                 snapshot_interval=SNAPSHOT_INTERVAL, tick_budget=SERVER_TICK_BUDGET):
+        self.host = host
+        self.port = port
+        self.array_backend = array_backend
+        self.stage = stage if stage is not None else load_stage()
+        self.snapshot_interval = snapshot_interval
+        self.tick_budget = tick_budget
+        self.listener = None
+        self.sessions = {}
+        self.next_id = 1
+        self.clients = set()
+        # Worlds of finished sessions, set up again for new ones
+        self.spare_worlds = []
+        self.rotation = 0           # Where the next tick's steps start
+        self.tick = 0
+        self.steps = 0
+        self.skipped = 0
+        self.busy = 0.0
+        self.frames = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    async def start(self):
+        """ Listen for clients, on a free port if port is 0 """
+        self.listener = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for client in list(self.clients):
+            client.writer.close()
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def serve(self, ticks=None):
+        """ Start, tick for ticks ticks (for ever if None) and stop """
+        await self.start()
+        try:
+            await self.run(ticks)
+        finally:
+            await self.stop()
+
+    async def run(self, ticks=None):
+        """ Tick on a fixed FIXED_DT schedule """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        end = None if ticks is None else self.tick + ticks
+        while end is None or self.tick < end:
+            started = time.perf_counter()
+            self.step_sessions()
+            self.tick += 1
+            if self.tick % self.snapshot_interval == 0:
+                self.broadcast()
+            self.busy += time.perf_counter() - started
+
+            next_tick += FIXED_DT
+            delay = next_tick - loop.time()
+            if delay < -MAX_STEPS_PER_UPDATE * FIXED_DT:
+                # Too far behind, drop the backlog instead of spiralling
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    def step_sessions(self):
+        """ Step each session once, as far as the tick budget goes """
+        sessions = list(self.sessions.values())
+        count = len(sessions)
+        start = time.perf_counter()
+        stepped = 0
+        while stepped < count and time.perf_counter() - start < self.tick_budget:
+            sessions[(self.rotation + stepped) % count].step()
+            stepped += 1
+        if count:
+            self.rotation = (self.rotation + stepped) % count
+        self.steps += stepped
+        self.skipped += count - stepped
+
+    def broadcast(self):
+        """ Send a frame to the clients of every session that moved on """
+        for session in self.sessions.values():
+            world = session.world
+            if session.sent_tick == (world.tick, world.explosions.time):
+                continue
+            session.sent_tick = (world.tick, world.explosions.time)
+            fields, body = encode_frame(world)
+            fields[5] = session.events
+            session.events = 0
+            for client in session.clients:
+                sent = client.send_frame(fields, body)
+                if sent:
+                    self.frames += 1
+                    self.sent_bytes += sent
+                    self.raw_bytes += MESSAGE_HEADER.size + FRAME_HEADER.size + len(body)
+
+    def join(self, client, session_id, seed):
+        """ Put client in a session, a new game unless session_id names one """
+        self.leave(client)
+        session = self.sessions.get(session_id)
+        if session is None:
+            if self.spare_worlds:
+                world = self.spare_worlds.pop()
+            else:
+                world = GameWorld(self.array_backend, self.stage)
+            world.setup(seed)
+            session = ServerSession(self.next_id, world)
+            self.next_id += 1
+            self.sessions[session.id] = session
+        session.clients.add(client)
+        client.session = session
+        client.session_id = session.id
+        client.frame = None
+        session.sent_tick = None
+        client.send(MSG_WELCOME, struct.pack("<I", session.id))
+
+    def leave(self, client):
+        """ Take client out of its session, ending the game if it was the last """
+        session = client.session
+        if session is None:
+            return
+        client.session = None
+        session.clients.discard(client)
+        if not session.clients:
+            del self.sessions[session.id]
+            self.spare_worlds.append(session.world)
+
+    async def handle_client(self, reader, writer):
+        client = ServerClient(writer)
+        self.clients.add(client)
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if CLIENT_PAYLOAD_SIZES.get(kind, len(payload)) != len(payload):
+                    raise ValueError("message %d has a %d byte payload" % (kind, len(payload)))
+                if kind == MSG_JOIN:
+                    session_id, seed, seeded = JOIN_PAYLOAD.unpack(payload)
+                    self.join(client, session_id, seed if seeded else None)
+                elif kind == MSG_INPUT and client.session is not None:
+                    inputs = payload[0]
+                    client.session.inputs = inputs & ~KEY_FIRE
+                    if inputs & KEY_FIRE:
+                        client.session.fire = True
+                elif kind == MSG_LEAVE:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # A client that hangs up or sends a malformed message is dropped
+            pass
+        finally:
+            self.leave(client)
+            self.clients.discard(client)
+            writer.close()
+
+    def stats(self):
+        ticks = max(self.tick, 1)
+        return {"tick": self.tick, "sessions": len(self.sessions), "clients": len(self.clients),
+                "steps": self.steps, "skipped_steps": self.skipped,
+                "busy": round(self.busy / (ticks * FIXED_DT), 3),
+                "tick_ms": round(1000 * self.busy / ticks, 3),
+                "frames": self.frames, "raw_bytes": self.raw_bytes,
+                "sent_bytes": self.sent_bytes}
+
+
+class RemoteWorld:
+    """
+    Stands in for GameWorld when MyGame is a thin client: the game runs on
+    a GameServer and this only holds the sprites of the last frame it sent.
+    advance() sends the keys when they change and takes in the frames that
+    have come since the last call.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.socket = None
+        self.received = bytearray()
+        self.connected = False
+
+        self.player_sprite = animated_sprite(PLAYER_IMAGES)
+        self.enemy_sprite = animated_sprite(CARRIER_IMAGES)
+        self.power_sprite = animated_sprite(POWER_IMAGES)
+        self.cloud_textures = [ASSETS.texture(image) for image in CLOUD_IMAGES]
+        self.enemy_textures = [ASSETS.texture("images/midway/Fighter1.png")]
+        self.red_textures = [ASSETS.texture("images/midway/Fighter2.png")]
+        self.bullet_textures = [ASSETS.texture("images/midway/Shot1.png")]
+        # Sprites for each list, kept between frames
+        self.spares = {"cloud_list": [], "enemy_list": [], "red_list": [], "bullet_list": []}
+        self.explosions = ExplosionFX()
+
+        self.events = []
+        self.tick = 0
+        self.game_over = False
+        self.profiler = FrameProfiler()
+
+    def connect(self):
+        """ Open the connection to the server, printing why if it can't """
+        host, port = self.address
+        try:
+            self.socket = socket.create_connection(self.address)
+        except OSError as error:
+            print("Can't connect to %s:%d: %s" % (host, port, error), file=sys.stderr)
+            return
+        self.socket.setblocking(False)
+        self.received = bytearray()
+        self.connected = True
+
+    def setup(self, seed=None):
+        """ Start a new game on the server, connecting first if need be """
+        if not self.connected:
+            self.connect()
+        self.cloud_list = arcade.SpriteList()
+        self.enemy_list = arcade.SpriteList()
+        self.red_list = arcade.SpriteList()
+        self.bullet_list = arcade.SpriteList()
+        self.explosions.clear()
+
+        # Off screen until the first frame comes
+        for sprite in (self.player_sprite, self.enemy_sprite, self.power_sprite):
+            sprite.set_texture(0)
+            sprite.center_x = SCREEN_WIDTH + 30
+            sprite.center_y = SCREEN_HEIGHT + 30
+        self.player_sprite.health = PLAYER_LIVES
+        self.score = 0
+        self.tick = 0
+        self.game_over = False
+        self.events = []
+        self.sent_inputs = 0
+        # Frames of the last game are dropped until the server's welcome
+        self.session_id = None
+        self.frame = b""
+        self.send(MSG_JOIN, JOIN_PAYLOAD.pack(0, seed or 0, seed is not None))
+        # With no server the game is over as soon as it starts
+        self.game_over = not self.connected
+
+    def send(self, kind, payload=b""):
+        if self.connected:
+            try:
+                self.socket.sendall(message(kind, payload))
+            except ConnectionError:
+                self.hang_up()
+
+    def hang_up(self):
+        """ The server went away or can't be followed, which ends the game """
+        self.connected = False
+        self.game_over = True
+        self.socket.close()
+
+    def close(self):
+        if self.connected:
+            self.send(MSG_LEAVE)
+            self.socket.close()
+            self.connected = False
+
+    def advance(self, delta_time, inputs=0):
+        """ Send the inputs if they changed, then draw from the newest frame """
+        sent = 0
+        if inputs != self.sent_inputs:
+            self.send(MSG_INPUT, bytes([inputs]))
+            self.sent_inputs = inputs & ~KEY_FIRE
+            sent = 1
+        self.events = []
+        self.receive()
+        return sent
+
+    def receive(self):
+        """ Decode every message that has come, apply the last frame """
+        while self.connected:
+            try:
+                data = self.socket.recv(1 << 16)
+            except BlockingIOError:
+                break
+            except ConnectionError:
+                data = b""
+            if not data:
+                self.hang_up()
+                break
+            self.received += data
+
+        events = 0
+        last = None
+        received = self.received
+        while len(received) >= MESSAGE_HEADER.size:
+            kind, size = MESSAGE_HEADER.unpack_from(received)
+            if size > MAX_MESSAGE_SIZE:
+                self.hang_up()
+                received.clear()
+                break
+            end = MESSAGE_HEADER.size + size
+            if len(received) < end:
+                break
+            payload = bytes(received[MESSAGE_HEADER.size:end])
+            del received[:end]
+            if kind == MSG_WELCOME:
+                self.session_id, = struct.unpack("<I", payload)
+                self.frame = b""
+            elif kind == MSG_FRAME and self.session_id is not None:
+                last, self.frame = decode_frame(payload, self.frame)
+                events |= last[5]
+        self.events = [event for event, bit in EVENT_BITS.items() if events & bit]
+        if last is not None:
+            self.apply(last, self.frame)
+        # Frames still buffered when the server went away don't undo hang_up()
+        self.game_over = self.game_over or not self.connected
+
+    def apply(self, fields, body):
+        """ Move the sprites to a decoded frame """
+        (self.tick, explosion_time, self.score, self.player_sprite.health, flags, _,
+         clouds, fighters, reds, bullets, explosions) = fields
+        self.game_over = bool(flags & FRAME_GAME_OVER)
+        values = array.array("h")
+        values.frombytes(body)
+
+        for i, sprite in enumerate((self.player_sprite, self.enemy_sprite, self.power_sprite)):
+            x, y, texture = values[3 * i:3 * i + 3]
+            sprite.position = (x, y)
+            sprite.texture = sprite.textures[texture]
+
+        start = 9
+        end = start + 3 * clouds
+        self.fill("cloud_list", values[start:end:3], values[start + 1:end:3],
+                  values[start + 2:end:3], self.cloud_textures)
+        for name, count, textures in (("enemy_list", fighters, self.enemy_textures),
+                                      ("red_list", reds, self.red_textures),
+                                      ("bullet_list", bullets, self.bullet_textures)):
+            start = end
+            end = start + 2 * count
+            self.fill(name, values[start:end:2], values[start + 1:end:2], [0] * count, textures)
+        start = end
+        end = start + 3 * explosions
+        self.explosions.load(explosion_time, zip(values[start:end:3], values[start + 1:end:3],
+                                                 values[start + 2:end:3]))
+
+    def fill(self, name, xs, ys, kinds, textures):
+        """ Make a sprite list show one sprite per x, y and texture index """
+        sprite_list = getattr(self, name)
+        spares = self.spares[name]
+        while len(spares) < len(xs):
+            spares.append(arcade.Sprite())
+        for sprite, x, y, kind in zip(spares, xs, ys, kinds):
+            sprite.texture = textures[kind]
+            sprite.position = (x, y)
+        while len(sprite_list) > len(xs):
+            sprite_list.pop()
+        for sprite in spares[len(sprite_list):len(xs)]:
+            sprite_list.append(sprite)
+
+    def sync_sprites(self):
+        pass
+
+    def entity_counts(self):
+        return {"enemies": len(self.enemy_list) + len(self.red_list),
+                "bullets": len(self.bullet_list), "explosions": len(self.explosions)}
+
+
+class LoopbackClient:
+    """
+    A stand-in thin client for testing a GameServer: it joins a new game,
+    presses keys with one of the batch POLICIES and decodes every frame
+    like RemoteWorld does, without drawing anything.
+    """
+
+    def __init__(self, seed, policy="random"):
+        self.seed = seed
+        self.policy = POLICIES[policy](random.Random(seed ^ 0x1943))
+        self.session_id = None
+        self.frame = b""
+        self.frames = 0
+        self.tick = 0               # Read by the policy, like a world's tick
+        self.inputs = 0
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(message(MSG_JOIN, JOIN_PAYLOAD.pack(0, self.seed, True)))
+
+    def leave(self):
+        self.writer.write(message(MSG_LEAVE))
+
+    async def receive(self):
+        """ Take frames until the server hangs up, answering each with keys """
+        try:
+            while True:
+                kind, payload = await read_message(self.reader)
+                if kind == MSG_WELCOME:
+                    self.session_id, = struct.unpack("<I", payload)
+                elif kind == MSG_FRAME:
+                    fields, self.frame = decode_frame(payload, self.frame)
+                    self.frames += 1
+                    self.tick = fields[0]
+                    inputs = self.policy(self)
+                    if inputs != self.inputs:
+                        self.writer.write(message(MSG_INPUT, bytes([inputs])))
+                        self.inputs = inputs & ~KEY_FIRE
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+
+
+def run_loopback_test(sessions, ticks=600, array_backend=False, policy="random"):
+    """
+    Serve sessions games to as many LoopbackClients over loopback for ticks
+    server ticks, then check each client decoded the same last frame the
+    server sent it. Returns the server's stats with the check's result.
+    """
+    async def test():
+        server = GameServer("127.0.0.1", 0, array_backend)
+        await server.start()
+        clients = [LoopbackClient(seed, policy) for seed in range(sessions)]
+        for client in clients:
+            await client.connect("127.0.0.1", server.port)
+        receivers = [asyncio.ensure_future(client.receive()) for client in clients]
+        start = time.perf_counter()
+        await server.run(ticks)
+        elapsed = time.perf_counter() - start
+        last_frames = {client.session_id: client.frame for client in server.clients}
+
+        for client in clients:
+            client.leave()
+        await asyncio.gather(*receivers)
+        await server.stop()
+
+        result = server.stats()
+        result["seconds"] = round(elapsed, 3)
+        result["ticks_per_second"] = round(ticks / elapsed, 1)
+        result["frames_decoded"] = sum(client.frames for client in clients)
+        result["in_sync"] = sum(client.frame == last_frames.get(client.session_id)
+                                for client in clients)
+        return result
+
+    return asyncio.run(test())
+
+
+def run_server(host, port, array_backend=False, stage=None, report_every=10.0):
+    """ Serve games until interrupted, printing the server's stats now and then """
+    server = GameServer(host, port, array_backend, stage)
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_every)
+            print(json.dumps(server.stats()), file=sys.stderr)
+
+    async def serve():
+        await server.start()
+        print("serving on %s:%d" % (server.host, server.port), file=sys.stderr)
+        reporter = asyncio.ensure_future(report())
+        try:
+            await server.run()
+        finally:
+            reporter.cancel()
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def save_recording(world, path):
+    """ Write the world's seed, inputs and final state to a recording file """
+    runs = bytearray()
+    inputs = world.recording
+    i = 0
+    while i < len(inputs):
+        run = 1
+        while i + run < len(inputs) and inputs[i + run] == inputs[i] and run < 0xFFFF:
+            run += 1
+        runs += RECORDING_RUN.pack(inputs[i], run)
+        i += run
+    header = RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, int(world.array_backend),
+                                   world.seed, len(inputs), world.score,
+                                   world.player_sprite.health, world.state_hash(),
+                                   stage_digest(world.stage))
+    budgets = RECORDING_BUDGETS.pack(len(world.budget_changes))
+    budgets += b"".join(RECORDING_BUDGET.pack(tick, *budget)
+                        for tick, budget in world.budget_changes)
+    with open(path, "wb") as f:
+        f.write(header + budgets + runs)
+
+
+def load_recording(path):
+    """ Read a recording file back into a dict """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, flags, seed, ticks, score, lives, state_hash, stage = \
+        RECORDING_HEADER.unpack_from(data)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise ValueError("%s is not a version %d recording" % (path, RECORDING_VERSION))
+    offset = RECORDING_HEADER.size
+    count, = RECORDING_BUDGETS.unpack_from(data, offset)
+    offset += RECORDING_BUDGETS.size
+    budgets = [(tick, EntityBudget(*budget)) for tick, *budget in RECORDING_BUDGET.iter_unpack(
+        data[offset:offset + count * RECORDING_BUDGET.size])]
+    offset += count * RECORDING_BUDGET.size
+    inputs = bytearray()
+    for value, run in RECORDING_RUN.iter_unpack(data[offset:]):
+        inputs += bytes([value]) * run
+    return {"array_backend": bool(flags & 1), "seed": seed, "inputs": inputs,
+            "budgets": budgets, "ticks": ticks, "score": score, "lives": lives,
+            "state_hash": state_hash, "stage": stage}
+
+
+def recording_world(recording, stage=None):
+    """
+    A world set up to replay a loaded recording, on stage or else the
+    default one. Raises ValueError if the recording was played on another.
+    """
+    world = GameWorld(recording["array_backend"], stage)
+    if stage_digest(world.stage) != recording["stage"]:
+        raise ValueError("the recording was played on another stage, give it with --stage")
+    world.follow_budgets(recording["budgets"])
+    world.setup(recording["seed"])
+    return world
+
+
+def replay_recording(path, stage=None):
+    """
+    Play a recording again as fast as possible, on stage or else the
+    default one, and check that it ends with the recorded score, lives and
+    state hash. Returns True if it does.
+    """
+    recording = load_recording(path)
+    try:
+        world = recording_world(recording, stage)
+    except ValueError as error:
+        print("%s: %s" % (path, error))
+        return False
+    start = time.perf_counter()
+    for inputs in recording["inputs"]:
+        world.events = []
+        world.step(inputs)
+    elapsed = time.perf_counter() - start
+
+    checks = [("score", world.score, recording["score"]),
+              ("lives", world.player_sprite.health, recording["lives"]),
+              ("state hash", world.state_hash(), recording["state_hash"])]
+    ok = True
+    for name, got, expected in checks:
+        if got != expected:
+            print("%s: replayed %s, recorded %s" % (name, got, expected))
+            ok = False
+    print("%d ticks in %.2f s, %.1fx real time: %s" % (
+        world.tick, elapsed, world.tick * FIXED_DT / max(elapsed, 1e-9),
+        "match" if ok else "MISMATCH"))
+    return ok
+
+
+def benchmark_collisions(bullets=10000, enemies=5000, brute_sample=100):
+    """
+    Time bullet-vs-enemy checks through SpatialHash against the plain
+    per-enemy list scan. Bullets fill the screen and enemies are spread
+    over the same stage height Enemy uses.
+    """
+    rng = random.Random(1943)
+    bullet_list = arcade.SpriteList()
+    for _ in range(bullets):
+        bullet = arcade.Sprite()
+        bullet.texture = ASSETS.texture("images/midway/Shot1.png")
+        bullet.center_x = rng.uniform(0, SCREEN_WIDTH)
+        bullet.center_y = rng.uniform(0, SCREEN_HEIGHT)
+        bullet_list.append(bullet)
+    enemy_list = []
+    for _ in range(enemies):
+        enemy = arcade.Sprite()
+        enemy.texture = ASSETS.texture("images/midway/Fighter1.png")
+        enemy.center_x = rng.uniform(0, SCREEN_WIDTH)
+        enemy.center_y = rng.uniform(0, SCREEN_HEIGHT * 30)
+        enemy_list.append(enemy)
+
+    start = time.perf_counter()
+    grid = SpatialHash()
+    grid.build(bullet_list)
+    hits = sum(len(grid.check_for_collision(enemy)) for enemy in enemy_list)
+    hashed = time.perf_counter() - start
+
+    # The list scan is far too slow to run in full, so time a sample
+    sample = enemy_list[:brute_sample]
+    start = time.perf_counter()
+    for enemy in sample:
+        arcade.check_for_collision_with_list(enemy, bullet_list)
+    brute = (time.perf_counter() - start) * len(enemy_list) / max(len(sample), 1)
+
+    print("%d bullets x %d enemies: %d hits" % (bullets, enemies, hits))
+    print("spatial hash: %.3f s per tick" % hashed)
+    print("list scan:    %.3f s per tick (estimated from %d enemies)" % (brute, len(sample)))
+
+
+def run_benchmark(name, ticks=600, array_backend=False, seed=1943):
+    """
+    Run one of BENCHMARK_SCENARIOS headless and return its measurements.
+    The player can't die, so every scenario runs all its ticks, and the
+    pools are uncapped so the stress isn't clipped; their counters give the
+    most each pool held next to its usual capacity. Peak memory comes from a
+    second, shorter run under tracemalloc so it doesn't skew the timing.
+    """
+    scenario = BENCHMARK_SCENARIOS[name]
+
+    def new_world():
+        world = GameWorld(array_backend)
+        world.setup(seed, enemy_count=scenario["enemies"])
+        world.player_sprite.health = 10 ** 9
+        world.bullet_pool.capacity = world.explosions.capacity = 10 ** 9
+        return world
+
+    def play(world, ticks):
+        bullets = scenario["bullets"]
+        for tick in range(ticks):
+            world.events = []
+            for i in range(bullets):
+                world.fire((i + 0.5) * SCREEN_WIDTH / bullets, 60)
+            for i in range(scenario["explosions"]):
+                world.explode(world.rng.uniform(0, SCREEN_WIDTH),
+                              world.rng.uniform(0, SCREEN_HEIGHT))
+            world.step(KEY_LEFT if tick // 60 % 2 else KEY_RIGHT)
+
+    world = new_world()
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    play(world, ticks)
+    elapsed = time.perf_counter() - start
+    counts = world.entity_counts()
+    result = {"scenario": name, "array_backend": array_backend, "ticks": ticks,
+              "seconds": elapsed, "ticks_per_sec": ticks / elapsed,
+              "gc_gen0_collections": gc.get_stats()[0]["collections"] - collections,
+              "net_allocated_blocks": sys.getallocatedblocks() - blocks,
+              "final_enemies": counts["enemies"],
+              "final_bullets": counts["bullets"],
+              "final_explosions": counts["explosions"]}
+    pools = world.pool_stats()
+    result["bullet_pool"] = dict(pools["bullets"], capacity=BULLET_POOL_SIZE)
+    result["explosion_pool"] = dict(pools["explosions"], capacity=MAX_EXPLOSIONS)
+
+    memory_ticks = min(ticks, 120)
+    tracemalloc.start()
+    play(new_world(), memory_ticks)
+    result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result["memory_ticks"] = memory_ticks
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--bench-collisions", action="store_true",
+                        help="time the collision grid against list scans and exit")
+    parser.add_argument("--bench-env", type=int, metavar="ENVS",
+                        help="time a VectorEnv of ENVS envs on --workers processes, "
+                             "print its steps per second and exit")
+    parser.add_argument("--frame-skip", type=int, default=4,
+                        help="ticks each --bench-env action is held for")
+    parser.add_argument("--array-backend", action="store_true",
+                        help="keep enemies and bullets in NumPy arrays")
+    parser.add_argument("--seed", type=int,
+                        help="seed every game with this number")
+    parser.add_argument("--record", metavar="FILE",
+                        help="save each finished game's inputs to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recording headless, check its result and exit")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="start with frame timing on and save it to FILE (.csv or .json)")
+    parser.add_argument("--stage", metavar="FILE",
+                        help="play, or replay, the stage in FILE instead of stages/midway.json")
+    parser.add_argument("--benchmark", nargs="*", metavar="SCENARIO",
+                        choices=sorted(BENCHMARK_SCENARIOS),
+                        help="run stress scenarios headless (all if none named) and exit")
+    parser.add_argument("--ticks", type=int,
+                        help="ticks per benchmark scenario (600) or batch game (7200)")
+    parser.add_argument("--bench-output", metavar="FILE",
+                        help="write the benchmark results as JSON to FILE")
+    parser.add_argument("--batch", type=int, metavar="GAMES",
+                        help="play GAMES headless games across all cores, summarize them and exit")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random",
+                        help="how batch games press the keys")
+    parser.add_argument("--workers", type=int,
+                        help="batch worker processes, one per core by default; "
+                             "for --bench-env, one process unless given")
+    parser.add_argument("--batch-output", metavar="FILE", default="batch.bin",
+                        help="stream batch results to FILE")
+    parser.add_argument("--summarize", metavar="FILE",
+                        help="print the distributions of a batch results FILE and exit")
+    parser.add_argument("--enemies", type=int, default=ENEMY_COUNT,
+                        help="fighters per batch game")
+    parser.add_argument("--lives", type=int, default=PLAYER_LIVES,
+                        help="player lives per batch game")
+    parser.add_argument("--speed", type=int, default=MOVEMENT_SPEED,
+                        help="player movement speed in batch games")
+    parser.add_argument("--serve", action="store_true",
+                        help="host games headless for thin clients until interrupted")
+    parser.add_argument("--connect", action="store_true",
+                        help="play on a game server as a thin client")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="game server address to serve on or connect to")
+    parser.add_argument("--port", type=int, default=SERVER_PORT,
+                        help="game server port")
+    parser.add_argument("--capture", metavar="OUTPUT",
+                        help="render a headless game, or the --replay, on the CPU to OUTPUT: "
+                             "'-' for raw RGB on stdout, a name with %%d for images, "
+                             "else a raw RGB file; then exit")
+    parser.add_argument("--fps", type=int, default=30,
+                        help="frames per second of game time to capture")
+    parser.add_argument("--target-fps", type=int, default=60,
+                        help="frame rate the entity budget governor holds the game to")
+    parser.add_argument("--governor-log", metavar="FILE",
+                        help="append the governor's decisions to FILE as JSON lines "
+                             "instead of printing them")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="never cap the entities, however long frames take")
+    parser.add_argument("--parallax", action="store_true",
+                        help="draw the parallax cloud layers over the sea")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print the startup timings in ms once everything has loaded")
+    parser.add_argument("--loopback-test", type=int, metavar="SESSIONS",
+                        help="serve SESSIONS games to stand-in clients over loopback, "
+                             "report and exit")
+    args = parser.parse_args()
+
+    if args.batch is not None:
+        run_batch(args.batch_output, args.batch, args.policy, args.ticks or 7200,
+                  args.seed or 0, args.workers, args.enemies, args.lives, args.speed,
+                  args.array_backend)
+        args.summarize = args.batch_output
+
+    if args.summarize:
+        print(json.dumps(summarize_batch(args.summarize), indent=1))
+        return
+
+    if args.benchmark is not None:
+        results = [run_benchmark(name, args.ticks or 600, args.array_backend)
+                   for name in args.benchmark or BENCHMARK_SCENARIOS]
+        output = json.dumps(results, indent=1)
+        if args.bench_output:
+            with open(args.bench_output, "w") as f:
+                f.write(output + "\n")
+        print(output)
+        return
+
+    stage = load_stage(args.stage) if args.stage else None
+    layers = BACKGROUND_LAYERS + (PARALLAX_LAYERS if args.parallax else [])
+    if args.capture:
+        try:
+            result = capture_game(args.capture, args.replay, args.policy, args.ticks, args.fps,
+                                  args.seed, args.array_backend, stage, layers)
+        except ValueError as error:
+            sys.exit("%s: %s" % (args.replay, error))
+        print(json.dumps(result), file=sys.stderr)
+        return
+
+    if args.replay:
+        sys.exit(0 if replay_recording(args.replay, stage) else 1)
+
+    if args.bench_collisions:
+        benchmark_collisions()
+        return
+
+    if args.bench_env is not None:
+        result = run_env_benchmark(args.bench_env, args.workers, args.frame_skip,
+                                   array_backend=args.array_backend)
+        print(json.dumps(result, indent=1))
+        return
+
+    if args.serve:
+        run_server(args.host, args.port, args.array_backend, stage)
+        return
+
+    if args.loopback_test is not None:
+        result = run_loopback_test(args.loopback_test, args.ticks or 600,
+                                   args.array_backend, args.policy)
+        print(json.dumps(result, indent=1))
+        return
+
+    MyGame(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, args.array_backend,
+           args.seed, args.record, args.profile, stage,
+           (args.host, args.port) if args.connect else None, args.startup_report, layers,
+           None if args.no_governor else FrameGovernor(args.target_fps, args.governor_log))
     arcade.run()
 
 
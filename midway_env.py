@@ -0,0 +1,38 @@
+"""
+Importable front end for the game's training environments.
+
+1943.py starts with a digit, so it can't be imported by name. This module
+loads it once as "midway" and re-exports what a training script needs:
+
+    from midway_env import GameEnv, VectorEnv, ACTIONS
+"""
+
+import importlib.util
+import os
+import sys
+
+GAME_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "1943.py")
+
+if "midway" in sys.modules:
+    midway = sys.modules["midway"]
+else:
+    _spec = importlib.util.spec_from_file_location("midway", GAME_PATH)
+    midway = importlib.util.module_from_spec(_spec)
+    # Registered before running it, so pickling and worker processes find it
+    sys.modules["midway"] = midway
+    _spec.loader.exec_module(midway)
+
+ACTIONS = midway.ACTIONS
+OBS_ENTITIES = midway.OBS_ENTITIES
+OBS_FRAME_SHAPE = midway.OBS_FRAME_SHAPE
+GameEnv = midway.GameEnv
+VectorEnv = midway.VectorEnv
+GameWorld = midway.GameWorld
+run_env_benchmark = midway.run_env_benchmark
+load_recording = midway.load_recording
+save_recording = midway.save_recording
+recording_world = midway.recording_world
+
+__all__ = ["ACTIONS", "OBS_ENTITIES", "OBS_FRAME_SHAPE", "GameEnv", "VectorEnv",
+           "GameWorld", "run_env_benchmark", "load_recording", "save_recording",
+           "recording_world", "midway"]
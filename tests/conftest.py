@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midway_env
+
+
+@pytest.fixture(scope="session")
+def game():
+    """ The 1943.py module, loaded once through midway_env """
+    return midway_env.midway
+
+
+@pytest.fixture(params=[False, True], ids=["sprites", "arrays"])
+def array_backend(request):
+    """ Run a test on both entity backends """
+    return request.param
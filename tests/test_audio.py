@@ -0,0 +1,59 @@
+import itertools
+
+import pytest
+
+
+class FakeSound:
+    """ Stands in for arcade.Sound, handing out a new voice per play() """
+    handles = itertools.count(1)
+
+    def __init__(self):
+        self.volumes = []
+        self.voice_handle = None
+
+    def play(self, volume=1.0):
+        self.volumes.append(volume)
+        self.voice_handle = next(self.handles)
+
+
+@pytest.fixture
+def mixer(game, monkeypatch):
+    # No audio device: voices are never found to have finished
+    monkeypatch.setattr(game.arcade.sound, "_audiolib", None)
+    mixer = game.AudioMixer("", {"shoot": "", "explode": ""}, "", max_voices=5, max_per_sound=3)
+    mixer.effects = {name: FakeSound() for name in ("shoot", "explode")}
+    mixer.loaded = True
+    return mixer
+
+
+def test_one_voice_per_effect_per_frame(mixer):
+    for _ in range(3):
+        mixer.play("shoot")
+    mixer.play("explode")
+    mixer.flush()
+    assert mixer.effects["shoot"].volumes == [1.0]
+    assert mixer.effects["explode"].volumes == [1.0]
+    assert mixer.stats() == {"voices": 2, "played": 2, "coalesced": 2, "dropped": 0}
+
+
+def test_voice_limits(mixer):
+    for _ in range(4):
+        mixer.play("shoot")
+        mixer.flush()
+    # Three voices at most for one effect
+    assert len(mixer.effects["shoot"].volumes) == 3
+    for _ in range(3):
+        mixer.play("explode")
+        mixer.flush()
+    # And five in all
+    assert len(mixer.effects["explode"].volumes) == 2
+    assert mixer.stats() == {"voices": 5, "played": 5, "coalesced": 0, "dropped": 2}
+
+
+def test_effects_dropped_until_loaded(mixer):
+    mixer.loaded = False
+    mixer.play("shoot")
+    mixer.flush()
+    assert mixer.effects["shoot"].volumes == []
+    assert mixer.dropped == 1
+    assert not mixer.pending
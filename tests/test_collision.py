@@ -0,0 +1,70 @@
+import math
+import random
+
+import pytest
+
+IMAGES = ["Fighter1.png", "Fighter2.png", "Plane1.png", "Shot1.png", "Enemy2.png", "Pow1a.png"]
+
+
+def pixel_overlap(game, name1, x1, y1, name2, x2, y2):
+    """ Brute force: any screen pixel opaque in both images """
+    image1 = game.ASSETS.image(name1)
+    image2 = game.ASSETS.image(name2)
+    alpha1 = image1.getchannel("A").load()
+    alpha2 = image2.getchannel("A").load()
+    width1, height1 = image1.size
+    width2, height2 = image2.size
+    left1 = math.floor(x1 - width1 / 2 + 0.5)
+    top1 = math.floor(y1 + height1 / 2 + 0.5)
+    left2 = math.floor(x2 - width2 / 2 + 0.5)
+    top2 = math.floor(y2 + height2 / 2 + 0.5)
+    for row in range(height1):
+        for column in range(width1):
+            if alpha1[column, row] <= game.MASK_ALPHA_THRESHOLD:
+                continue
+            column2 = left1 + column - left2
+            row2 = top2 - (top1 - row)
+            if 0 <= column2 < width2 and 0 <= row2 < height2 and \
+                    alpha2[column2, row2] > game.MASK_ALPHA_THRESHOLD:
+                return True
+    return False
+
+
+def test_masks_match_brute_force(game):
+    rng = random.Random(3)
+    hits = 0
+    for _ in range(400):
+        name1 = rng.choice(IMAGES)
+        name2 = rng.choice(IMAGES)
+        x1, y1 = rng.uniform(100, 200), rng.uniform(100, 200)
+        x2, y2 = x1 + rng.uniform(-60, 60), y1 + rng.uniform(-60, 60)
+        mask1 = game.ASSETS.texture(name1).collision_mask
+        mask2 = game.ASSETS.texture(name2).collision_mask
+        expected = pixel_overlap(game, name1, x1, y1, name2, x2, y2)
+        assert mask1.overlaps(x1, y1, mask2, x2, y2) == expected, (name1, x1, y1, name2, x2, y2)
+        hits += expected
+    # Enough of both outcomes for the comparison to mean something
+    assert 40 < hits < 360
+
+
+@pytest.mark.parametrize("name", IMAGES)
+def test_mask_touches_itself(game, name):
+    mask = game.ASSETS.texture(name).collision_mask
+    assert mask.overlaps(50, 50, mask, 50, 50)
+    assert not mask.overlaps(50, 50, mask, 50 + mask.width, 50)
+
+
+def test_sprites_collide_uses_masks(game):
+    import arcade
+    rng = random.Random(4)
+    sprite1 = arcade.Sprite()
+    sprite1.texture = game.ASSETS.texture("Plane1.png")
+    sprite2 = arcade.Sprite()
+    sprite2.texture = game.ASSETS.texture("Fighter1.png")
+    for _ in range(200):
+        sprite1.position = rng.uniform(100, 200), rng.uniform(100, 200)
+        sprite2.position = (sprite1.center_x + rng.uniform(-50, 50),
+                            sprite1.center_y + rng.uniform(-50, 50))
+        expected = pixel_overlap(game, "Plane1.png", *sprite1.position,
+                                 "Fighter1.png", *sprite2.position)
+        assert game.sprites_collide(sprite1, sprite2) == expected
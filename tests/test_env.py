@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import midway_env
+
+
+def play(env, steps=120, seed=3):
+    env.reset(seed=seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(steps):
+        obs, reward, done, info = env.step(rng.integers(len(midway_env.ACTIONS)))
+    return obs
+
+
+def test_entity_speeds(game):
+    speeds = {1: game.FIGHTER_SPEED, 2: game.RED_SPEED,
+              3: game.CARRIER_SPEED, 4: game.POWERUP_SPEED}
+    rows = play(midway_env.GameEnv())["entities"]
+    rows = rows[rows[:, 0] > 0]
+    assert len(rows)
+    for kind, _, _, change_x, change_y in rows:
+        expected_x, expected_y = speeds[int(kind)]
+        assert change_x == pytest.approx(expected_x / game.SCREEN_WIDTH)
+        assert change_y == pytest.approx(expected_y / game.SCREEN_HEIGHT)
+
+
+def test_backends_observe_alike():
+    sprites = play(midway_env.GameEnv(frame=True))
+    arrays = play(midway_env.GameEnv(frame=True, array_backend=True))
+    for name in sprites:
+        assert np.allclose(sprites[name], arrays[name])
+
+
+def test_worker_processes_match(array_backend):
+    kwargs = {"frame_skip": 4, "max_ticks": 200, "array_backend": array_backend}
+    local = midway_env.VectorEnv(4, **kwargs)
+    workers = midway_env.VectorEnv(4, workers=2, **kwargs)
+    try:
+        expected = local.reset(seed=5)
+        got = workers.reset(seed=5)
+        rng = np.random.default_rng(0)
+        for _ in range(80):
+            actions = rng.integers(len(midway_env.ACTIONS), size=4)
+            expected, expected_reward, expected_done, _ = local.step(actions)
+            got, reward, done, _ = workers.step(actions)
+            for name in expected:
+                assert np.array_equal(expected[name], got[name])
+            assert np.array_equal(expected_reward, reward)
+            assert np.array_equal(expected_done, done)
+    finally:
+        workers.close()
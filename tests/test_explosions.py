@@ -0,0 +1,53 @@
+# An explosion shows sheet frames 1 to frames - 1, one per update(), and
+# is gone once it would show frame frames, like the old explosion sprites
+
+
+def test_explosion_plays_every_frame_then_ends(game):
+    fx = game.ExplosionFX(frames=5)
+    fx.add(10, 20)
+    shown = []
+    while len(fx):
+        shown.extend(frame for _, _, frame in fx.rows())
+        fx.update()
+    assert shown == [1, 2, 3, 4]
+
+
+def test_explosion_started_on_a_later_frame(game):
+    fx = game.ExplosionFX(frames=5)
+    fx.update()
+    fx.add(0, 0, frame=3)
+    assert [frame for _, _, frame in fx.rows()] == [3]
+    fx.update()
+    assert [frame for _, _, frame in fx.rows()] == [4]
+    fx.update()
+    assert len(fx) == 0
+
+
+def test_explosions_finish_in_order(game):
+    fx = game.ExplosionFX()
+    for i in range(3):
+        fx.add(i, 0)
+        fx.update()
+    for _ in range(game.EXPLOSION_FRAMES - 4):
+        fx.update()
+    assert [x for x, _, _ in fx.rows()] == [1, 2]
+
+
+def test_explosion_capacity(game):
+    fx = game.ExplosionFX(frames=4, capacity=2)
+    assert fx.add(0, 0) and fx.add(1, 1)
+    assert not fx.add(2, 2)
+    assert fx.dropped == 1
+
+
+def test_world_explosion_lasts_its_frames(game, array_backend):
+    world = game.GameWorld(array_backend)
+    world.setup(1)
+    world.spawner.pending = []
+    world.explode(300, 600)
+    lasted = 0
+    while world.entity_counts()["explosions"]:
+        world.step(0)
+        lasted += 1
+    # Frame 1 shows until the first step, then one more frame per step
+    assert lasted == game.EXPLOSION_FRAMES - 1
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def world(game):
+    world = game.GameWorld()
+    world.setup(1)
+    return world
+
+
+def feed(governor, world, frames, update_ms, draw_ms=0.0):
+    for _ in range(frames):
+        governor.frame(world, update_ms, draw_ms)
+
+
+def test_steps_down_when_frames_run_long(game, world, tmp_path):
+    log = tmp_path / "governor.log"
+    governor = game.FrameGovernor(60, str(log))
+    feed(governor, world, game.GOVERNOR_WINDOW - 1, 20.0)
+    assert governor.level == 0
+    feed(governor, world, 1, 20.0)
+    assert governor.level == 1
+    assert world.budget == game.BUDGET_LEVELS[1]
+    # A full window at the new level before stepping again
+    feed(governor, world, game.GOVERNOR_WINDOW - 1, 10.0, 10.0)
+    assert governor.level == 1
+    feed(governor, world, 1, 10.0, 10.0)
+    assert governor.level == 2
+    decisions = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(d["from"], d["level"]) for d in decisions] == [(0, 1), (1, 2)]
+    assert decisions[1]["update_ms"] == 10.0 and decisions[1]["draw_ms"] == 10.0
+
+
+def test_never_past_the_last_level(game, world, tmp_path):
+    governor = game.FrameGovernor(60, str(tmp_path / "governor.log"))
+    feed(governor, world, game.GOVERNOR_WINDOW * (len(game.BUDGET_LEVELS) + 2), 50.0)
+    assert governor.level == len(game.BUDGET_LEVELS) - 1
+
+
+def test_steps_back_up_only_with_headroom(game, world, tmp_path):
+    governor = game.FrameGovernor(60, str(tmp_path / "governor.log"))
+    feed(governor, world, game.GOVERNOR_WINDOW, 20.0)
+    assert governor.level == 1
+    # Under the target but without the headroom: stays down
+    feed(governor, world, game.GOVERNOR_RECOVER_WINDOW, 0.8 * governor.target_ms)
+    assert governor.level == 1
+    # Up once nine frames in ten of the longer window are well under
+    fast = game.GOVERNOR_RECOVER_WINDOW * 9 // 10 + 1
+    feed(governor, world, fast - 1, 1.0)
+    assert governor.level == 1
+    feed(governor, world, 1, 1.0)
+    assert governor.level == 0
+    assert world.budget == game.BUDGET_LEVELS[0]
+
+
+def test_budget_changes_replay(game, world, tmp_path):
+    governor = game.FrameGovernor(60, str(tmp_path / "governor.log"))
+    for tick in range(300):
+        world.step(0)
+        if world.game_over:
+            break
+        governor.frame(world, 20.0 if tick < 100 else 1.0, 0.0)
+    assert world.budget_changes
+    path = str(tmp_path / "game.m43r")
+    game.save_recording(world, path)
+    assert game.replay_recording(path)
@@ -0,0 +1,19 @@
+import arcade
+
+
+def test_sprite_pool_counters(game):
+    pool = game.SpritePool(arcade.Sprite, 2)
+    first = pool.activate()
+    second = pool.activate()
+    assert pool.activate() is None
+    pool.deactivate(first)
+    assert pool.activate() is first
+    assert pool.stats() == {"hits": 1, "misses": 2, "dropped": 1, "active": 2, "size": 2}
+    assert second.active
+
+
+def test_benchmark_reports_pools(game):
+    result = game.run_benchmark("explosion_storm", ticks=20)
+    assert result["explosion_pool"]["peak"] > 0
+    assert result["explosion_pool"]["capacity"] == game.MAX_EXPLOSIONS
+    assert result["bullet_pool"]["capacity"] == game.BULLET_POOL_SIZE
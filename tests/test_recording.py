@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+
+def play(game, array_backend, seed=42, ticks=3000):
+    return game.run_headless(ticks, game.random_policy(random.Random(seed)),
+                             array_backend=array_backend, seed=seed)
+
+
+def test_recording_round_trip(game, array_backend, tmp_path):
+    world = play(game, array_backend)
+    path = str(tmp_path / "game.m43r")
+    game.save_recording(world, path)
+
+    recording = game.load_recording(path)
+    assert recording["array_backend"] == array_backend
+    assert recording["seed"] == 42
+    assert recording["ticks"] == world.tick == len(recording["inputs"])
+    assert bytes(recording["inputs"]) == bytes(world.recording)
+    assert recording["score"] == world.score
+    assert recording["lives"] == world.player_sprite.health
+    assert recording["state_hash"] == world.state_hash()
+    assert recording["stage"] == game.stage_digest(world.stage)
+
+    assert game.replay_recording(path)
+
+
+def test_same_seed_same_game(game, array_backend):
+    first = play(game, array_backend, ticks=1200)
+    second = play(game, array_backend, ticks=1200)
+    assert first.state_hash() == second.state_hash()
+    assert first.score == second.score
+
+
+def test_recording_rejects_other_files(game, tmp_path):
+    path = tmp_path / "bad.m43r"
+    path.write_bytes(b"M43R\x00" + bytes(game.RECORDING_HEADER.size))
+    with pytest.raises(ValueError):
+        game.load_recording(str(path))
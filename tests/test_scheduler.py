@@ -0,0 +1,31 @@
+def test_calls_once_when_due(game):
+    scheduler = game.Scheduler()
+    calls = []
+    scheduler.schedule(0.5, lambda: calls.append("late"))
+    scheduler.schedule(0.2, lambda: calls.append("early"))
+    scheduler.update(0.1)
+    assert calls == []
+    scheduler.update(0.1)
+    assert calls == ["early"]
+    scheduler.update(1.0)
+    assert calls == ["early", "late"]
+    scheduler.update(1.0)
+    assert calls == ["early", "late"]
+
+
+def test_same_time_in_order_scheduled(game):
+    scheduler = game.Scheduler()
+    calls = []
+    for name in "abc":
+        scheduler.schedule(1.0, lambda name=name: calls.append(name))
+    scheduler.update(1.0)
+    assert calls == ["a", "b", "c"]
+
+
+def test_clear(game):
+    scheduler = game.Scheduler()
+    calls = []
+    scheduler.schedule(0.1, lambda: calls.append(1))
+    scheduler.clear()
+    scheduler.update(1.0)
+    assert calls == []
@@ -0,0 +1,102 @@
+import asyncio
+import random
+import socket
+import struct
+import time
+
+import pytest
+
+
+def test_frame_codec_round_trip(game, array_backend):
+    world = game.GameWorld(array_backend)
+    world.setup(4)
+    policy = game.random_policy(random.Random(4))
+    sent = None
+    received = None
+    for tick in range(300):
+        world.events = []
+        world.step(policy(world))
+        fields, body = game.encode_frame(world)
+        # A key frame every second, deltas between
+        base = None if tick % 60 == 0 else sent
+        payload = game.encode_frame_payload(fields, body, base)
+        decoded, received = game.decode_frame(payload, received)
+        assert received == body
+        assert list(decoded[:4]) + list(decoded[5:]) == fields[:4] + fields[5:]
+        assert decoded[4] & ~game.FRAME_KEY == fields[4]
+        assert bool(decoded[4] & game.FRAME_KEY) == (base is None)
+        sent = body
+
+
+def test_loopback_sessions(game):
+    result = game.run_loopback_test(2, ticks=60)
+    assert result["sessions"] == 0
+    assert result["frames_decoded"] > 0
+    assert result["in_sync"] == 2
+
+
+@pytest.mark.parametrize("data", [
+    struct.pack("<BI", 2, 0),                   # MSG_INPUT without its byte
+    struct.pack("<BI", 1, 3) + b"abc",          # MSG_JOIN too short
+    struct.pack("<BI", 9, 0xFFFFFFFF),          # Over the size limit
+])
+def test_server_drops_bad_clients(game, data):
+    async def test():
+        server = game.GameServer("127.0.0.1", 0)
+        await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(data)
+        dropped = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+
+        # The server carries on serving others
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(game.message(game.MSG_JOIN, game.JOIN_PAYLOAD.pack(0, 1, True)))
+        kind, payload = await asyncio.wait_for(game.read_message(reader), 5)
+        writer.close()
+        await server.stop()
+        return dropped, kind
+
+    dropped, kind = asyncio.run(test())
+    assert dropped == b""
+    assert kind == game.MSG_WELCOME
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def test_client_without_server(game):
+    world = game.RemoteWorld(("127.0.0.1", free_port()))
+    world.setup(1)
+    assert world.game_over
+    assert not world.connected
+    world.advance(1 / 60, game.KEY_FIRE)
+    world.close()
+
+
+def test_client_ends_game_when_server_hangs_up(game):
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        world = game.RemoteWorld(listener.getsockname())
+        world.setup(1)
+        connection, _ = listener.accept()
+
+        # A frame of a game still going, then the server goes away
+        played = game.GameWorld()
+        played.setup(1)
+        for _ in range(30):
+            played.step(0)
+        fields, body = game.encode_frame(played)
+        connection.sendall(game.message(game.MSG_WELCOME, struct.pack("<I", 1)) +
+                           game.message(game.MSG_FRAME, game.encode_frame_payload(fields, body, None)))
+        connection.close()
+        time.sleep(0.2)
+
+    world.receive()
+    assert world.tick == 30
+    assert not world.connected
+    assert world.game_over
@@ -0,0 +1,52 @@
+import random
+import struct
+
+import pytest
+
+
+def test_snapshot_round_trip(game, array_backend):
+    policy = game.random_policy(random.Random(5))
+    world = game.GameWorld(array_backend)
+    world.setup(7)
+    world.player_sprite.health = 50
+    for _ in range(900):
+        world.events = []
+        world.step(policy(world))
+    data = world.snapshot()
+
+    copy = game.GameWorld(array_backend)
+    copy.setup(99)
+    copy.restore(data)
+    assert copy.state_hash() == world.state_hash()
+    assert copy.snapshot() == data
+
+    # Both go on to play the same game
+    inputs = [policy(world) for _ in range(1500)]
+    for each in (world, copy):
+        for keys in inputs:
+            each.events = []
+            each.step(keys)
+    assert copy.state_hash() == world.state_hash()
+    assert copy.score == world.score
+
+    # And a world can go back to its own snapshot
+    world.restore(data)
+    assert world.snapshot() == data
+
+
+def test_snapshot_needs_same_backend(game):
+    world = game.GameWorld(False)
+    world.setup(1)
+    other = game.GameWorld(True)
+    other.setup(1)
+    with pytest.raises(ValueError):
+        other.restore(world.snapshot())
+
+
+@pytest.mark.parametrize("data", [b"", b"M43S\x01", b"M43R" + bytes(200)])
+def test_snapshot_rejects_bad_data(game, data):
+    # The errors MyGame.quickload() expects from a bad quicksave file
+    world = game.GameWorld(False)
+    world.setup(1)
+    with pytest.raises((ValueError, struct.error)):
+        world.restore(data)
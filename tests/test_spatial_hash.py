@@ -0,0 +1,77 @@
+import random
+
+import arcade
+import PIL.Image
+
+IMAGES = ["Fighter1.png", "Fighter2.png", "Shot1.png", "cloud-left.png"]
+
+
+def scatter(game, rng, count, textures):
+    sprites = []
+    for _ in range(count):
+        sprite = arcade.Sprite()
+        sprite.texture = rng.choice(textures)
+        sprite.position = rng.uniform(-50, 650), rng.uniform(-50, 850)
+        sprites.append(sprite)
+    return sprites
+
+
+def test_matches_a_scan_of_the_list(game):
+    rng = random.Random(1)
+    textures = [game.ASSETS.texture(name) for name in IMAGES]
+    sprites = scatter(game, rng, 300, textures)
+    grid = game.SpatialHash()
+    grid.build(sprites)
+    for sprite in scatter(game, rng, 200, textures):
+        expected = [other for other in sprites if game.sprites_collide(sprite, other)]
+        assert set(grid.check_for_collision(sprite)) == set(expected)
+
+
+def test_matches_arcade_without_masks(game):
+    # Textures with no collision mask fall back to arcade's hit boxes
+    rng = random.Random(2)
+    textures = [arcade.Texture("box%d" % size, PIL.Image.new("RGBA", (size, size), (255, 0, 0, 255)))
+                for size in (8, 30, 90)]
+    sprites = scatter(game, rng, 200, textures)
+    sprite_list = arcade.SpriteList(use_spatial_hash=False)
+    for sprite in sprites:
+        sprite_list.append(sprite)
+    grid = game.SpatialHash()
+    grid.build(sprites)
+    for sprite in scatter(game, rng, 100, textures):
+        expected = arcade.check_for_collision_with_list(sprite, sprite_list)
+        assert set(grid.check_for_collision(sprite)) == set(expected)
+
+
+def test_move_and_remove(game):
+    texture = game.ASSETS.texture("Fighter1.png")
+    first, second = arcade.Sprite(), arcade.Sprite()
+    for sprite in (first, second):
+        sprite.texture = texture
+        sprite.position = 100, 100
+    grid = game.SpatialHash()
+    grid.build([first])
+    assert grid.check_for_collision(second) == [first]
+    first.position = 400, 400
+    grid.move(first)
+    assert grid.check_for_collision(second) == []
+    second.position = 400, 400
+    assert grid.check_for_collision(second) == [first]
+    grid.remove(first)
+    assert len(grid) == 0
+    assert grid.check_for_collision(second) == []
+
+
+def test_every_shot_enemy_scores(game, array_backend):
+    # Two fighters, each with a bullet reaching it on the next step
+    world = game.GameWorld(array_backend)
+    world.setup(1)
+    world.spawner.pending = []
+    for x in (100, 300):
+        if array_backend:
+            world.enemy_store.spawn(x, 400, *game.FIGHTER_SPEED)
+        else:
+            world.spawn_sprite("fighter", x, 400)
+        world.fire(x, 400 + game.FIGHTER_SPEED[1] - 20)
+    world.step(0)
+    assert world.score == 2
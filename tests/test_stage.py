@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+STAGES = {
+    "midway": None,
+    "repeating": {"waves": [
+        {"tick": 30, "kind": "fighter", "count": 6, "x": [0, 500], "y": [700, 3000],
+         "repeat": 4, "interval": 200},
+        {"tick": 0, "kind": "red", "count": 5, "x": [0, 0], "y": [900, 900], "step": [0, 30]},
+        {"tick": 10, "kind": "cloud-left", "count": 3, "x": [10, 50], "y": [644, 2000]},
+    ]},
+}
+
+
+@pytest.mark.parametrize("name", STAGES)
+def test_streaming_matches_eager_placement(game, name):
+    stage = STAGES[name] or game.load_stage()
+    spawner = game.StageSpawner(stage, random.Random(1))
+    # Placing everything up front, as the game used to: every sprite sits
+    # where its wave put it and moves from the wave's tick on
+    eager = {order: (tick, kind, x, y) for _, order, tick, kind, x, y in spawner.pending}
+    streamed = {}
+    for clock in range(4000):
+        for order, kind, x, y in spawner.due(clock):
+            streamed[order] = (clock, x, y)
+        for order, (tick, kind, x, y) in eager.items():
+            if tick > clock:
+                continue
+            image, (change_x, change_y) = game.SPAWN_KINDS[kind][2:]
+            x += change_x * (clock - tick)
+            y += change_y * (clock - tick)
+            if y - game.ASSETS.texture(image).height / 2 > game.SCREEN_HEIGHT:
+                continue
+            # On screen, so it must have been streamed in by now, and be
+            # where it would have been all along
+            assert order in streamed, (clock, kind)
+            spawned, spawn_x, spawn_y = streamed[order]
+            assert spawn_x + change_x * (clock - spawned) == x
+            assert spawn_y + change_y * (clock - spawned) == y
+    assert len(spawner) == 0
+    assert len(streamed) == len(eager)
+
+
+def test_nothing_spawned_far_above_the_screen(game, array_backend):
+    world = game.GameWorld(array_backend)
+    world.setup(2)
+    world.sync_sprites()
+    limit = game.SCREEN_HEIGHT + game.SPAWN_MARGIN + game.FIGHTER_SPEED[1] * -1
+    for sprite in list(world.enemy_list) + list(world.red_list) + list(world.cloud_list):
+        assert sprite.bottom <= limit
+    assert len(world.spawner) > 0
+
+
+def test_recording_rejects_other_stage(game, tmp_path):
+    world = game.run_headless(300, seed=42)
+    path = str(tmp_path / "game.m43r")
+    game.save_recording(world, path)
+    recording = game.load_recording(path)
+    stage = dict(world.stage, waves=world.stage["waves"][:1])
+    with pytest.raises(ValueError):
+        game.recording_world(recording, stage)
+    assert game.recording_world(recording).seed == 42